@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0002_remove_comentario_autor_remove_comentario_post_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivo",
+            name="fecha_modificacion_archivo",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="archivo",
+            name="hash_sha256",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivo",
+            name="tamano_archivo",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
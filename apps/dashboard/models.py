@@ -2,11 +2,23 @@
 Modelos para la aplicación dashboard.
 Este módulo contiene los modelos de datos para el sistema de dashboard,
 """
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+import hashlib
+import os
+import shutil
 
 User = get_user_model()
 
+
+def calcular_hash_contenido(contenido):
+    """Calcula el SHA-256 de un archivo subido recorriendo sus bloques y lo deja al inicio."""
+    hash_obj = hashlib.sha256()
+    for chunk in contenido.chunks():
+        hash_obj.update(chunk)
+    contenido.seek(0)
+    return hash_obj.hexdigest()
+
 class Archivo(models.Model):
     TIPO_CHOICES = [
         ('imagen', 'Imagen'),
@@ -25,6 +37,11 @@ class Archivo(models.Model):
     publico = models.BooleanField(default=False)
     es_formulario = models.BooleanField(default=False)
 
+    # Hash del contenido y huella (tamaño + fecha de modificación) del archivo almacenado
+    hash_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    tamano_archivo = models.BigIntegerField(null=True, blank=True, editable=False)
+    fecha_modificacion_archivo = models.DateTimeField(null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ['-fecha_subida']
         verbose_name = 'Archivo'
@@ -35,14 +52,159 @@ class Archivo(models.Model):
 
     def save(self, *args, **kwargs):
         # Si el archivo ya existe y se está actualizando, eliminar el archivo anterior
+        # (solo si ningún otro registro comparte el mismo contenido almacenado)
         if self.pk:
             try:
                 old = Archivo.objects.get(pk=self.pk)
                 if old.archivo and self.archivo != old.archivo:
-                    old.archivo.delete(save=False)
+                    old.eliminar_archivo_almacenado()
             except Archivo.DoesNotExist:
                 pass
+        self.blob_reutilizado = False
+        if self.archivo and not self.archivo._committed:
+            self._guardar_contenido_deduplicado()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                    'archivo', 'hash_sha256', 'tamano_archivo', 'fecha_modificacion_archivo'
+                }
         super().save(*args, **kwargs)
+
+    def _guardar_contenido_deduplicado(self):
+        """
+        Guarda el archivo subido en el almacenamiento deduplicando por SHA-256:
+        si otro registro ya tiene el mismo contenido, se apunta a su archivo almacenado
+        en lugar de escribir una copia nueva.
+        """
+        self.hash_sha256 = calcular_hash_contenido(self.archivo.file)
+        existente = (
+            Archivo.objects.filter(hash_sha256=self.hash_sha256)
+            .exclude(pk=self.pk)
+            .exclude(archivo='')
+            .first()
+        )
+        if existente and existente.archivo.storage.exists(existente.archivo.name):
+            self.archivo = existente.archivo.name
+            self.tamano_archivo = existente.tamano_archivo
+            self.fecha_modificacion_archivo = existente.fecha_modificacion_archivo
+            self.blob_reutilizado = True
+            return
+        self.archivo.save(self.archivo.name, self.archivo.file, save=False)
+        self.tamano_archivo, self.fecha_modificacion_archivo = self.huella_archivo()
+
+    @classmethod
+    def crear_desde_ruta(cls, ruta, nombre_archivo, hash_sha256, **campos):
+        """
+        Registra un archivo ya escrito en disco (p. ej. una subida por bloques) sin volver
+        a leerlo. Si otro registro tiene el mismo SHA-256 se apunta a su archivo almacenado;
+        si no, `ruta` se enlaza (o se copia) dentro del almacenamiento. `ruta` solo se borra
+        cuando la transacción confirma: si se revierte, sigue en su sitio para reintentar.
+        Requiere un almacenamiento en el sistema de archivos local (FileSystemStorage).
+        """
+        archivo = cls(hash_sha256=hash_sha256, **campos)
+        campo = cls._meta.get_field('archivo')
+        existente = (
+            cls.objects.filter(hash_sha256=hash_sha256)
+            .exclude(archivo='')
+            .first()
+        )
+        reutilizado = bool(existente and existente.archivo.storage.exists(existente.archivo.name))
+        if reutilizado:
+            archivo.archivo = existente.archivo.name
+        else:
+            nombre_almacenado = campo.storage.get_available_name(campo.generate_filename(archivo, nombre_archivo))
+            destino = campo.storage.path(nombre_almacenado)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            try:
+                os.link(ruta, destino)
+            except OSError:
+                # Sistema de archivos sin enlaces duros o en otro dispositivo
+                shutil.copyfile(ruta, destino)
+            archivo.archivo = nombre_almacenado
+        archivo.blob_reutilizado = reutilizado
+        try:
+            archivo.tamano_archivo, archivo.fecha_modificacion_archivo = archivo.huella_archivo()
+            archivo.save()
+        except Exception:
+            archivo.descartar_almacenado()
+            raise
+        transaction.on_commit(lambda: cls._borrar_ruta(ruta))
+        return archivo
+
+    def descartar_almacenado(self):
+        """Elimina el archivo colocado por crear_desde_ruta si no era uno reutilizado."""
+        if self.archivo and not getattr(self, 'blob_reutilizado', True):
+            self.archivo.storage.delete(self.archivo.name)
+
+    @staticmethod
+    def _borrar_ruta(ruta):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+    def referencias_archivo(self):
+        """Número de registros (incluido este) que apuntan al mismo archivo almacenado."""
+        if not self.archivo:
+            return 0
+        return Archivo.objects.filter(archivo=self.archivo.name).exclude(pk=self.pk).count() + 1
+
+    def eliminar_archivo_almacenado(self):
+        """
+        Elimina el archivo físico solo si este registro es su última referencia.
+        Retorna True si el archivo se eliminó del almacenamiento.
+        """
+        if not self.archivo or not self.archivo.name:
+            return False
+        if self.referencias_archivo() > 1:
+            return False
+        self.archivo.delete(save=False)
+        return True
+
+    def huella_archivo(self):
+        """Devuelve (tamaño, fecha de modificación) del archivo almacenado sin leer su contenido."""
+        storage = self.archivo.storage
+        try:
+            fecha_modificacion = storage.get_modified_time(self.archivo.name)
+        except NotImplementedError:
+            fecha_modificacion = None
+        return storage.size(self.archivo.name), fecha_modificacion
+
+    def calcular_hash(self):
+        """Calcula el hash SHA-256 leyendo el archivo completo."""
+        hash_obj = hashlib.sha256()
+        with self.archivo.open('rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                hash_obj.update(chunk)
+        return hash_obj.hexdigest()
+
+    def obtener_hash(self):
+        """
+        Devuelve el hash SHA-256 del archivo. Solo se vuelve a leer el archivo
+        cuando su huella (tamaño + fecha de modificación) cambió desde el último cálculo.
+        """
+        huella = self.huella_archivo()
+        hash_guardado = self.hash_vigente(huella)
+        if hash_guardado:
+            return hash_guardado
+        self.registrar_hash(self.calcular_hash(), huella)
+        return self.hash_sha256
+
+    def hash_vigente(self, huella):
+        """Hash guardado si la huella indicada coincide con la del último cálculo; None si hay que releer el archivo."""
+        if self.hash_sha256 and huella == (self.tamano_archivo, self.fecha_modificacion_archivo):
+            return self.hash_sha256
+        return None
+
+    def registrar_hash(self, hash_sha256, huella):
+        """Guarda un hash calculado junto con la huella que tenía el archivo antes de leerlo."""
+        self.hash_sha256 = hash_sha256
+        self.tamano_archivo, self.fecha_modificacion_archivo = huella
+        if self.pk:
+            Archivo.objects.filter(pk=self.pk).update(
+                hash_sha256=self.hash_sha256,
+                tamano_archivo=self.tamano_archivo,
+                fecha_modificacion_archivo=self.fecha_modificacion_archivo,
+            )
         
     def get_nombre_archivo(self):
     # Obtener el nombre completo del archivo incluyendo la extensión, pero sin la ruta
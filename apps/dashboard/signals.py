@@ -4,6 +4,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Archivo
 from apps.guia.models import GuiaAutocontrol
+from apps.guia.tasks import encolar_extraccion
 import logging
 import os
 
@@ -26,8 +27,11 @@ def crear_guia_desde_archivo(sender, instance, created, **kwargs):
                         titulo_guia=nombre_sin_ext,
                         activa=True
                     )
-                    guia.extraer_contenido_archivo()
-                    logger.info(f"Guía '{guia.titulo_guia}' creada automáticamente para el archivo: {instance.nombre}")
+                    if guia.reutilizar_contenido_existente():
+                        logger.info(f"Guía '{guia.titulo_guia}' creada para el archivo {instance.nombre}; contenido reutilizado de una subida idéntica")
+                    else:
+                        encolar_extraccion(guia)
+                        logger.info(f"Guía '{guia.titulo_guia}' creada para el archivo {instance.nombre}; extracción encolada")
                 except Exception as e:
                     logger.error(f"Error al crear guía automáticamente para el archivo {instance.nombre}: {e}")
         else:
@@ -74,4 +74,47 @@ class DashboardSignalsTestCase(TestCase):
         )
         self.assertFalse(archivo.es_formulario)
 
+
+class ArchivoDeduplicacionTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='dedupuser', password='deduppass', is_staff=True)
+        self.client.login(username='dedupuser', password='deduppass')
+        self.original = Archivo.objects.create(
+            nombre='Original',
+            archivo=SimpleUploadedFile('original.txt', b'contenido repetido'),
+            tipo='documento',
+            subido_por=self.user,
+        )
+
+    def tearDown(self):
+        if self.original.archivo and self.original.archivo.storage.exists(self.original.archivo.name):
+            self.original.archivo.delete(save=False)
+
+    def test_subida_identica_reutiliza_archivo_almacenado(self):
+        copia = Archivo.objects.create(
+            nombre='Copia',
+            archivo=SimpleUploadedFile('otro_nombre.txt', b'contenido repetido'),
+            tipo='documento',
+            subido_por=self.user,
+        )
+        self.assertTrue(copia.blob_reutilizado)
+        self.assertEqual(copia.archivo.name, self.original.archivo.name)
+        self.assertEqual(copia.hash_sha256, self.original.hash_sha256)
+        self.assertEqual(self.original.referencias_archivo(), 2)
+
+    def test_eliminar_archivo_conserva_archivo_compartido(self):
+        copia = Archivo.objects.create(
+            nombre='Copia',
+            archivo=SimpleUploadedFile('copia.txt', b'contenido repetido'),
+            tipo='documento',
+            subido_por=self.user,
+        )
+        response = self.client.post(reverse('eliminar_archivo', args=[copia.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Archivo.objects.filter(pk=copia.pk).exists())
+        self.assertTrue(self.original.archivo.storage.exists(self.original.archivo.name))
+
+        self.assertTrue(self.original.eliminar_archivo_almacenado())
+
 # Puedes agregar más tests para editar/eliminar archivos y enlaces, y para AJAX si lo necesitas.
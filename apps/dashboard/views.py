@@ -38,7 +38,10 @@ def gestionar_archivos(request):
     Vista para gestionar archivos subidos.
     Permite subir nuevos archivos y muestra una lista de archivos existentes.
     """
-    archivos = Archivo.objects.all().order_by('-fecha_subida')
+    # De la guía la lista solo muestra el estado del procesamiento: no se cargan sus JSON
+    archivos = Archivo.objects.select_related('subido_por', 'guia_autocontrol').defer(
+        'guia_autocontrol__contenido_procesado', 'guia_autocontrol__indice_preguntas'
+    ).order_by('-fecha_subida')
 
     if request.method == 'POST':
         try:
@@ -59,6 +62,10 @@ def gestionar_archivos(request):
             else:
                 archivo.save()
                 messages.success(request, 'Archivo subido correctamente.')
+                if archivo.blob_reutilizado:
+                    messages.info(request, 'El contenido ya existía; se reutiliza el archivo almacenado.')
+                if archivo.es_formulario:
+                    messages.info(request, 'La guía se está procesando en segundo plano.')
                 return redirect('gestionar_archivos')
         except Exception as e:
             messages.error(request, f'Error al subir el archivo: {str(e)}')
@@ -76,10 +83,10 @@ def eliminar_archivo(request, pk):
     archivo = get_object_or_404(Archivo, pk=pk)
 
     if request.method == 'POST':
-        # Eliminar el archivo físico del sistema de archivos
+        # Eliminar el archivo físico si ningún otro registro lo comparte
         if archivo.archivo and archivo.archivo.name:
             try:
-                archivo.archivo.delete(save=False)
+                archivo.eliminar_archivo_almacenado()
             except Exception as e:
                 messages.error(request, f'Error al eliminar el archivo físico: {str(e)}')
                 return redirect('gestionar_archivos')
@@ -0,0 +1,151 @@
+"""
+Motor de clasificación de filas para el parseo de cuestionarios de guías de autocontrol.
+
+Las reglas son datos: cada plantilla de guía es una lista ordenada de `ReglaFila`
+y la primera regla que coincide determina el tipo de la fila. Los patrones se
+compilan una sola vez al importar el módulo o al registrar la plantilla.
+"""
+import re
+
+TIPO_VACIA = 'vacia'
+TIPO_ENCABEZADO = 'encabezado'
+TIPO_CIERRE = 'cierre'
+TIPO_COMPONENTE = 'componente'
+TIPO_BLOQUE = 'bloque'
+TIPO_PREGUNTA = 'pregunta'
+
+# Alcances de una regla: qué celdas de la fila se evalúan
+ALCANCE_CUALQUIERA = 'cualquiera'
+ALCANCE_COLUMNA = 'columna'
+ALCANCE_VACIA = 'vacia'
+ALCANCE_UNIFORME = 'uniforme'
+
+PLANTILLA_POR_DEFECTO = 'defecto'
+
+_CARACTERES_CONTROL = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]')
+_SURROGADOS = re.compile(r'[\ud800-\udfff]')
+
+
+def limpiar_texto(texto):
+    """Limpia el texto eliminando caracteres no deseados y normalizando espacios."""
+    if not isinstance(texto, str):
+        return str(texto)
+    texto = ' '.join(_CARACTERES_CONTROL.sub('', texto).split())
+    if _SURROGADOS.search(texto):
+        # Un texto con surrogados sueltos no se puede codificar en UTF-8
+        texto = texto.encode('ascii', 'ignore').decode('ascii')
+    return texto
+
+
+def limpiar_fila(fila):
+    """Limpia todas las celdas de una fila en una pasada; las celdas combinadas repetidas se limpian una vez."""
+    limpias = {}
+    celdas = []
+    for texto in fila:
+        if not texto:
+            celdas.append('')
+            continue
+        limpio = limpias.get(texto)
+        if limpio is None:
+            limpio = limpias[texto] = limpiar_texto(texto)
+        celdas.append(limpio)
+    return celdas
+
+
+def _texto_pregunta(celda, coincidencia):
+    """Texto de la pregunta sin su numeración inicial (grupo 'texto' de la regla)."""
+    return coincidencia.group('texto').strip()
+
+
+class ReglaFila:
+    """
+    Regla declarativa de clasificación de una fila de cuestionario:
+    - tipo: tipo asignado a la fila cuando la regla coincide.
+    - patron: expresión regular (se compila al crear la regla).
+    - alcance: 'cualquiera' (alguna celda), 'columna' (una celda concreta),
+      'vacia' (todas las celdas vacías) o 'uniforme' (todas las celdas con texto
+      iguales y la primera no vacía).
+    - metodo: 'search' o 'match' para aplicar el patrón.
+    - extraer: función (celda, coincidencia) que devuelve el dato de la fila;
+      por defecto, el texto de la celda que coincidió.
+    """
+    def __init__(self, tipo, patron=None, alcance=ALCANCE_CUALQUIERA, columna=0,
+                 minimo_celdas=0, flags=0, metodo='search', extraer=None):
+        self.tipo = tipo
+        self.alcance = alcance
+        self.columna = columna
+        self.minimo_celdas = minimo_celdas
+        self.extraer = extraer
+        self._buscar = None
+        if patron is not None:
+            compilado = re.compile(patron, flags)
+            self._buscar = compilado.match if metodo == 'match' else compilado.search
+
+    def _resultado(self, celda, coincidencia):
+        return self.extraer(celda, coincidencia) if self.extraer else celda
+
+    def aplicar(self, celdas):
+        """Devuelve (True, dato) si la regla coincide con la fila o (False, None) si no."""
+        if len(celdas) < self.minimo_celdas:
+            return False, None
+        if self.alcance == ALCANCE_VACIA:
+            return not any(celdas), None
+        if self.alcance == ALCANCE_UNIFORME:
+            if celdas[0] and len({c for c in celdas if c}) == 1:
+                return True, celdas[0]
+            return False, None
+        if self.alcance == ALCANCE_COLUMNA:
+            if self.columna >= len(celdas):
+                return False, None
+            celda = celdas[self.columna]
+            coincidencia = self._buscar(celda)
+            return (True, self._resultado(celda, coincidencia)) if coincidencia else (False, None)
+        for celda in celdas:
+            if celda:
+                coincidencia = self._buscar(celda)
+                if coincidencia:
+                    return True, self._resultado(celda, coincidencia)
+        return False, None
+
+
+class ClasificadorFilas:
+    """Aplica una lista ordenada de reglas y devuelve la primera que coincide."""
+    def __init__(self, reglas):
+        self.reglas = list(reglas)
+
+    def clasificar(self, celdas, desde=0):
+        """
+        Clasifica una fila ya limpia. Devuelve (indice_regla, tipo, dato) o
+        (None, None, None) si ninguna regla coincide. `desde` permite continuar
+        con las reglas siguientes cuando el parser descarta una coincidencia.
+        """
+        for indice in range(desde, len(self.reglas)):
+            regla = self.reglas[indice]
+            coincide, dato = regla.aplicar(celdas)
+            if coincide:
+                return indice, regla.tipo, dato
+        return None, None, None
+
+
+REGLAS_POR_DEFECTO = [
+    ReglaFila(TIPO_VACIA, alcance=ALCANCE_VACIA),
+    ReglaFila(TIPO_ENCABEZADO, r'ASPECTOS A VERIFICAR', flags=re.IGNORECASE),
+    ReglaFila(TIPO_CIERRE, r'Elaborado y aprobado', alcance=ALCANCE_COLUMNA, columna=0),
+    ReglaFila(TIPO_COMPONENTE, alcance=ALCANCE_UNIFORME, minimo_celdas=3),
+    ReglaFila(TIPO_BLOQUE, r':\s*$'),
+    # Un dígito seguido de al menos un carácter; 'texto' es lo que queda tras la numeración
+    ReglaFila(TIPO_PREGUNTA, r'^(?=\d.)\d+\.?\s*(?P<texto>.*)', alcance=ALCANCE_COLUMNA, columna=1,
+              minimo_celdas=2, metodo='match', extraer=_texto_pregunta),
+]
+
+_PLANTILLAS = {PLANTILLA_POR_DEFECTO: ClasificadorFilas(REGLAS_POR_DEFECTO)}
+
+
+def registrar_plantilla(nombre, reglas):
+    """Registra (o reemplaza) el conjunto de reglas de una plantilla de guía."""
+    _PLANTILLAS[nombre] = ClasificadorFilas(reglas)
+
+
+def obtener_clasificador(nombre=PLANTILLA_POR_DEFECTO):
+    """Clasificador de la plantilla indicada; si no existe se usa la plantilla por defecto."""
+    return _PLANTILLAS.get(nombre, _PLANTILLAS[PLANTILLA_POR_DEFECTO])
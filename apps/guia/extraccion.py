@@ -0,0 +1,287 @@
+"""Modelo intermedio de documento para la extracción de guías de autocontrol"""
+from xml.etree import ElementTree
+from django.conf import settings
+from docx import Document
+from .clasificacion import TIPO_CIERRE, TIPO_ENCABEZADO, TIPO_PREGUNTA
+import PyPDF2
+import re
+import zipfile
+
+BACKEND_PYTHON_DOCX = 'python-docx'
+BACKEND_STREAMING = 'streaming'
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_BODY = _W + 'body'
+_P = _W + 'p'
+_R = _W + 'r'
+_T = _W + 't'
+_HYPERLINK = _W + 'hyperlink'
+_TBL = _W + 'tbl'
+_TR = _W + 'tr'
+_TC = _W + 'tc'
+_TCPR = _W + 'tcPr'
+_TRPR = _W + 'trPr'
+_GRID_SPAN = _W + 'gridSpan'
+_GRID_BEFORE = _W + 'gridBefore'
+_V_MERGE = _W + 'vMerge'
+_VAL = _W + 'val'
+_BR = _W + 'br'
+_TYPE = _W + 'type'
+_PDF_NUMERO_PAGINA = re.compile(r'^P[áa]gina\s+\d+(\s+de\s+\d+)?$', re.IGNORECASE)
+_PDF_NUMERO_SUELTO = re.compile(r'^\d+\.?$')
+_PDF_FIN_DE_LINEA = (':', '?')
+_TEXTO_ELEMENTOS_RUN = {
+    _W + 'tab': '\t',
+    _W + 'ptab': '\t',
+    _W + 'cr': '\n',
+    _W + 'noBreakHyphen': '-',
+}
+
+
+class DocumentoExtraido:
+    """
+    Representación ligera de un documento ya leído:
+    - parrafos: texto de cada párrafo del cuerpo, en orden.
+    - tablas: lista de tablas; cada tabla es una lista de filas y cada fila
+      una lista con el texto de sus celdas (las celdas combinadas se repiten
+      igual que en python-docx).
+    Todos los extractores (componente, propósito y cuestionario) leen de aquí,
+    de modo que el archivo se abre y recorre una sola vez.
+    """
+    def __init__(self, parrafos=None, tablas=None):
+        self.parrafos = parrafos if parrafos is not None else []
+        self.tablas = tablas if tablas is not None else []
+
+    def filas(self):
+        """Itera todas las filas de todas las tablas en orden de documento."""
+        for tabla in self.tablas:
+            yield from tabla
+
+    def texto_completo(self):
+        """Reconstruye el texto completo: párrafos y luego filas de tablas separadas por ' | '."""
+        partes = ["\n".join(self.parrafos)]
+        for fila in self.filas():
+            fila_texto = " | ".join(texto.strip() for texto in fila if texto.strip())
+            if fila_texto:
+                partes.append(fila_texto + "\n")
+        return "".join(partes)
+
+
+def cargar_documento_docx(path):
+    """
+    Carga un .docx en un DocumentoExtraido en una sola pasada.
+    El texto de una celda combinada se calcula una única vez por fila.
+    """
+    doc = Document(path)
+    parrafos = [parrafo.text for parrafo in doc.paragraphs]
+    tablas = []
+    for tabla in doc.tables:
+        filas = []
+        for fila in tabla.rows:
+            textos_por_celda = {}
+            celdas = []
+            for celda in fila.cells:
+                clave = id(celda)
+                if clave not in textos_por_celda:
+                    textos_por_celda[clave] = celda.text
+                celdas.append(textos_por_celda[clave])
+            filas.append(celdas)
+        tablas.append(filas)
+    return DocumentoExtraido(parrafos, tablas)
+
+
+def _texto_run(run):
+    """Texto de un w:r con las mismas equivalencias que python-docx (tabs, saltos, guiones)."""
+    partes = []
+    for hijo in run:
+        if hijo.tag == _T:
+            partes.append(hijo.text or '')
+        elif hijo.tag == _BR:
+            partes.append('\n' if hijo.get(_TYPE, 'textWrapping') == 'textWrapping' else '')
+        else:
+            partes.append(_TEXTO_ELEMENTOS_RUN.get(hijo.tag, ''))
+    return ''.join(partes)
+
+
+def _texto_parrafo(parrafo):
+    """Texto de un w:p: sus runs directos y los runs de sus hipervínculos."""
+    partes = []
+    for hijo in parrafo:
+        if hijo.tag == _R:
+            partes.append(_texto_run(hijo))
+        elif hijo.tag == _HYPERLINK:
+            partes.extend(_texto_run(run) for run in hijo if run.tag == _R)
+    return ''.join(partes)
+
+
+def _entero_propiedad(propiedades, tag, defecto):
+    """Lee el atributo w:val entero de una propiedad de celda o fila."""
+    if propiedades is None:
+        return defecto
+    elemento = propiedades.find(tag)
+    if elemento is None:
+        return defecto
+    return int(elemento.get(_VAL, defecto))
+
+
+def _celdas_fila(fila, fila_anterior):
+    """
+    Resuelve las celdas de un w:tr igual que `_Row.cells` de python-docx:
+    gridSpan repite el texto de la celda y vMerge="continue" toma el de la celda
+    superior en la misma columna de la cuadrícula. Cada texto se calcula una vez.
+    Devuelve la lista de textos y el mapa desplazamiento -> textos para la siguiente fila.
+    """
+    celdas = []
+    por_desplazamiento = {}
+    desplazamiento = _entero_propiedad(fila.find(_TRPR), _GRID_BEFORE, 0)
+    for celda in fila:
+        if celda.tag != _TC:
+            continue
+        propiedades = celda.find(_TCPR)
+        span = _entero_propiedad(propiedades, _GRID_SPAN, 1)
+        v_merge = propiedades.find(_V_MERGE) if propiedades is not None else None
+        if v_merge is not None and v_merge.get(_VAL, 'continue') == 'continue' and desplazamiento in fila_anterior:
+            textos = fila_anterior[desplazamiento]
+        else:
+            texto = '\n'.join(_texto_parrafo(p) for p in celda if p.tag == _P)
+            textos = [texto] * span
+        celdas.extend(textos)
+        por_desplazamiento[desplazamiento] = textos
+        desplazamiento += span
+    return celdas, por_desplazamiento
+
+
+def iterar_elementos_docx(path):
+    """
+    Recorre word/document.xml con un parser XML incremental y genera tuplas
+    ('parrafo', texto), ('tabla', None) al abrir cada tabla y ('fila', celdas)
+    para los párrafos y filas de tablas del cuerpo, en orden de documento. Cada elemento se descarta tras emitirse, por lo
+    que la memoria no crece con el tamaño del documento y el consumidor puede
+    detener la lectura en cualquier momento.
+    """
+    with zipfile.ZipFile(path) as paquete, paquete.open('word/document.xml') as xml:
+        pila = []
+        fila_anterior = {}
+        for evento, elemento in ElementTree.iterparse(xml, events=('start', 'end')):
+            if evento == 'start':
+                if elemento.tag == _TBL and pila and pila[-1].tag == _BODY:
+                    fila_anterior = {}
+                    yield 'tabla', None
+                pila.append(elemento)
+                continue
+
+            pila.pop()
+            if not pila:
+                continue
+            padre = pila[-1]
+            if elemento.tag == _P and padre.tag == _BODY:
+                yield 'parrafo', _texto_parrafo(elemento)
+                padre.remove(elemento)
+            elif elemento.tag == _TR and padre.tag == _TBL and len(pila) > 1 and pila[-2].tag == _BODY:
+                celdas, fila_anterior = _celdas_fila(elemento, fila_anterior)
+                yield 'fila', celdas
+                padre.remove(elemento)
+            elif elemento.tag == _TBL and padre.tag == _BODY:
+                padre.remove(elemento)
+
+
+def iterar_filas_docx(path):
+    """Genera solo las filas de tablas de un .docx leyendo el XML de forma incremental."""
+    for tipo, contenido in iterar_elementos_docx(path):
+        if tipo == 'fila':
+            yield contenido
+
+
+def cargar_documento_docx_streaming(path):
+    """Carga un .docx en un DocumentoExtraido sin construir el árbol de objetos de python-docx."""
+    parrafos = []
+    tablas = []
+    for tipo, contenido in iterar_elementos_docx(path):
+        if tipo == 'parrafo':
+            parrafos.append(contenido)
+        elif tipo == 'tabla':
+            tablas.append([])
+        else:
+            tablas[-1].append(contenido)
+    return DocumentoExtraido(parrafos, tablas)
+
+
+def iterar_paginas_pdf(path):
+    """
+    Genera el texto de cada página de un PDF extrayéndolo una sola vez por página.
+    Las páginas se leen bajo demanda: si el consumidor se detiene, el resto no se procesa.
+    """
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for pagina in reader.pages:
+            yield pagina.extract_text() or ''
+
+
+def _es_linea_de_componente(linea):
+    """Un componente es una línea en mayúsculas con al menos dos palabras significativas."""
+    return linea.isupper() and sum(len(palabra) >= 4 for palabra in linea.split()) >= 2
+
+
+def _fila_pdf(linea, es_componente):
+    """Convierte una línea lógica en una fila con la forma de las filas de tablas .docx."""
+    return [linea] * 3 if es_componente else [linea, linea]
+
+
+def iterar_filas_pdf(paginas, clasificador):
+    """
+    Reconstruye filas de cuestionario a partir del texto de las páginas de un PDF.
+    Las líneas físicas se unen en líneas lógicas: una línea inicia una fila nueva si
+    por sí sola es un encabezado, un cierre, una pregunta numerada (o su número
+    suelto, cuando el texto está en otra columna) o un componente,
+    o si la fila anterior ya terminó en ':' o '?'. Cada línea lógica se emite como
+    una fila que el clasificador trata igual que una fila de tabla .docx.
+    """
+    actual = None
+    actual_es_componente = False
+    for texto in paginas:
+        for linea in texto.splitlines():
+            linea = linea.strip()
+            if not linea or _PDF_NUMERO_PAGINA.match(linea):
+                if actual:
+                    yield _fila_pdf(actual, actual_es_componente)
+                    actual = None
+                continue
+            es_componente = _es_linea_de_componente(linea)
+            _, tipo, _ = clasificador.clasificar([linea, linea])
+            inicia_fila = (
+                actual is None
+                or es_componente
+                or actual_es_componente
+                or tipo in (TIPO_ENCABEZADO, TIPO_CIERRE, TIPO_PREGUNTA)
+                or _PDF_NUMERO_SUELTO.match(linea)
+                or actual.endswith(_PDF_FIN_DE_LINEA)
+            )
+            if inicia_fila:
+                if actual:
+                    yield _fila_pdf(actual, actual_es_componente)
+                actual = linea
+                actual_es_componente = es_componente
+            else:
+                actual = f'{actual} {linea}'
+    if actual:
+        yield _fila_pdf(actual, actual_es_componente)
+
+
+def backend_docx():
+    """Backend de lectura de .docx configurado en settings.GUIA_PARSER_DOCX."""
+    return getattr(settings, 'GUIA_PARSER_DOCX', BACKEND_PYTHON_DOCX)
+
+
+def cargar_documento(path):
+    """Carga un .docx en un DocumentoExtraido usando el backend configurado."""
+    if backend_docx() == BACKEND_STREAMING:
+        return cargar_documento_docx_streaming(path)
+    return cargar_documento_docx(path)
+
+
+def iterar_filas(path):
+    """Itera las filas de tablas de un .docx usando el backend configurado."""
+    if backend_docx() == BACKEND_STREAMING:
+        return iterar_filas_docx(path)
+    return cargar_documento_docx(path).filas()
+
@@ -0,0 +1,78 @@
+"""
+Índice compacto del cuestionario de una guía.
+
+El extractor guarda junto al contenido procesado un índice plano con el orden de las
+preguntas y, para cada una, la posición de su componente y de su bloque. Así el progreso
+y las estadísticas se resuelven con búsquedas en lugar de recorrer tablas_cuestionario.
+"""
+
+VERSION_INDICE = 1
+
+
+def construir_indice_preguntas(contenido):
+    """
+    Construye el índice persistible a partir de contenido_procesado:
+    - preguntas: números de pregunta en el orden del documento
+    - componentes / bloques: nombres y encabezados, en orden
+    - componente_de / bloque_de: posición del componente y del bloque de cada pregunta
+    - total_por_componente: preguntas de cada componente
+    """
+    indice = {
+        'version': VERSION_INDICE,
+        'preguntas': [],
+        'componentes': [],
+        'bloques': [],
+        'componente_de': [],
+        'bloque_de': [],
+        'total_por_componente': [],
+    }
+    for componente in (contenido or {}).get('tablas_cuestionario', []):
+        posicion_componente = len(indice['componentes'])
+        indice['componentes'].append(componente.get('componente_a_evaluar', ''))
+        total = 0
+        for bloque in componente.get('bloques', []):
+            posicion_bloque = len(indice['bloques'])
+            indice['bloques'].append(bloque.get('encabezado', ''))
+            for pregunta in bloque.get('preguntas', []):
+                indice['preguntas'].append(pregunta.get('numero_pregunta'))
+                indice['componente_de'].append(posicion_componente)
+                indice['bloque_de'].append(posicion_bloque)
+                total += 1
+        indice['total_por_componente'].append(total)
+    return indice
+
+
+def expandir_indice(indice):
+    """
+    Convierte el índice persistido en las estructuras de consulta que usan las vistas:
+    preguntas (lista ordenada), componente_de y bloque_de ({número: nombre}),
+    posicion_de ({número: posición en preguntas}), por_componente ([(componente, [números])]
+    en orden) y total_por_componente ({componente: total}).
+    """
+    componentes = indice['componentes']
+    bloques = indice['bloques']
+    por_componente = [(nombre, []) for nombre in componentes]
+    componente_de = {}
+    bloque_de = {}
+    posicion_de = {}
+    for posicion, (numero, posicion_componente, posicion_bloque) in enumerate(zip(
+        indice['preguntas'], indice['componente_de'], indice['bloque_de']
+    )):
+        por_componente[posicion_componente][1].append(numero)
+        if numero is not None:
+            posicion_de.setdefault(numero, posicion)
+        componente_de[numero] = componentes[posicion_componente]
+        bloque_de[numero] = bloques[posicion_bloque]
+
+    total_por_componente = {}
+    for nombre, total in zip(componentes, indice['total_por_componente']):
+        total_por_componente[nombre] = total_por_componente.get(nombre, 0) + total
+
+    return {
+        'preguntas': list(indice['preguntas']),
+        'componente_de': componente_de,
+        'bloque_de': bloque_de,
+        'posicion_de': posicion_de,
+        'por_componente': por_componente,
+        'total_por_componente': total_por_componente,
+    }
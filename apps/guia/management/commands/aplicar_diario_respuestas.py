@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.guia.models import DiarioRespuesta
+from apps.guia.tasks import aplicar_diario_respuestas_async
+
+
+class Command(BaseCommand):
+    help = 'Aplica a RespuestaGuia las entradas pendientes del diario de respuestas (p. ej. tras una caída del proceso)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=None,
+            help='Número de entradas aplicadas por transacción (por defecto settings.GUIA_DIARIO_LOTE)'
+        )
+
+    def handle(self, *args, **options):
+        pendientes = DiarioRespuesta.objects.count()
+        self.stdout.write(self.style.NOTICE(f'Entradas pendientes en el diario: {pendientes}'))
+        aplicadas = aplicar_diario_respuestas_async(limite=options.get('lote'))
+        self.stdout.write(self.style.SUCCESS(f'¡Diario aplicado! {aplicadas} entrada(s) aplicada(s)'))
@@ -0,0 +1,282 @@
+"""
+Comando generador de carga para el autoguardado de respuestas (guardar_cambios).
+
+Simula usuarios con la guía abierta que autoguardan de forma continua, cada uno con su
+propia conexión, y mide el rendimiento con conexiones concurrentes:
+- Sin --url: dentro del proceso, por el manejador ASGI (AsyncClient, vistas async) y por
+  el manejador WSGI (Client en hilos), para comparar ambas rutas con la misma carga.
+- Con --url: contra un servidor en ejecución, por ejemplo
+  `uvicorn infoweb.asgi:application` frente a `gunicorn infoweb.wsgi`.
+Los usuarios de prueba se crean al empezar y se eliminan (con sus respuestas) al terminar.
+"""
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.db import connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from apps.guia.models import GuiaAutocontrol, EvaluacionGuia, RespuestaGuia
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from urllib.parse import urlsplit
+import asyncio
+import http.client
+import json
+import platform
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+PREFIJO_USUARIOS = 'bench_autoguardado_'
+
+
+def _cuerpos_autoguardado(numeros, guardados, semilla):
+    """Genera los cuerpos JSON de los lotes de un usuario: un cambio por lote con client_seq creciente."""
+    aleatorio = random.Random(semilla)
+    client_id = f'bench-{semilla}'
+    return [
+        json.dumps({
+            'client_id': client_id,
+            'client_seq': seq,
+            'changes': [{
+                'numero_pregunta': aleatorio.choice(numeros),
+                'respuesta': aleatorio.choice(['si', 'no', 'na']),
+                'fundamentacion': '',
+            }],
+        })
+        for seq in range(1, guardados + 1)
+    ]
+
+
+def _resumen(etiqueta, latencias, errores, duracion):
+    """Resume una medición: peticiones por segundo y percentiles de latencia en ms."""
+    total = len(latencias)
+    ordenadas = sorted(latencias)
+    return {
+        'modo': etiqueta,
+        'peticiones': total,
+        'errores': len(errores),
+        'codigos_error': sorted({str(codigo) for codigo in errores}),
+        'duracion_s': round(duracion, 3),
+        'peticiones_por_segundo': round(total / duracion, 1) if duracion else 0,
+        'p50_ms': round(statistics.median(ordenadas) * 1000, 1) if ordenadas else 0,
+        'p95_ms': round(ordenadas[int(0.95 * (total - 1))] * 1000, 1) if ordenadas else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento del autoguardado con conexiones concurrentes por las rutas ASGI (async) y WSGI (sync)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'guia_id',
+            type=int,
+            help='ID de la guía sobre la que se autoguardan respuestas'
+        )
+        parser.add_argument(
+            '--usuarios',
+            type=int,
+            default=20,
+            help='Número de usuarios (conexiones) concurrentes'
+        )
+        parser.add_argument(
+            '--guardados',
+            type=int,
+            default=20,
+            help='Lotes de autoguardado que envía cada usuario'
+        )
+        parser.add_argument(
+            '--modo',
+            choices=['asgi', 'wsgi', 'ambos'],
+            default='ambos',
+            help='Ruta medida dentro del proceso (sin --url)'
+        )
+        parser.add_argument(
+            '--url',
+            help='URL base de un servidor en ejecución (p. ej. http://127.0.0.1:8000); mide por HTTP'
+        )
+        parser.add_argument(
+            '--json',
+            dest='salida_json',
+            help='Ruta del archivo JSON donde guardar los resultados'
+        )
+
+    def handle(self, *args, **options):
+        guia = GuiaAutocontrol.objects.filter(pk=options['guia_id'], activa=True).first()
+        if guia is None:
+            self.stdout.write(self.style.ERROR(f"No existe una guía activa con ID {options['guia_id']}"))
+            return
+        numeros = [numero for _, numeros in guia.get_indice_preguntas() for numero in numeros if numero is not None]
+        if not numeros:
+            self.stdout.write(self.style.ERROR(f'La guía {guia.pk} no tiene preguntas procesadas'))
+            return
+
+        cantidad = max(1, options['usuarios'])
+        guardados = max(1, options['guardados'])
+        ruta = reverse('guia:guardar_cambios', args=[guia.pk])
+        cuerpos = [_cuerpos_autoguardado(numeros, guardados, indice) for indice in range(cantidad)]
+
+        if options['url']:
+            modos = ['http']
+        elif options['modo'] == 'ambos':
+            modos = ['wsgi', 'asgi']
+        else:
+            modos = [options['modo']]
+
+        self.stdout.write(self.style.NOTICE(
+            f'Autoguardado sobre la guía {guia.pk}: {cantidad} usuario(s) concurrentes, '
+            f'{guardados} lote(s) por usuario, modo(s) {", ".join(modos)}'
+        ))
+        usuarios = self._crear_usuarios(cantidad)
+        resultados = []
+        try:
+            for modo in modos:
+                # Cada medición parte sin respuestas previas de los usuarios de prueba
+                RespuestaGuia.objects.filter(usuario__in=usuarios).delete()
+                EvaluacionGuia.objects.filter(usuario__in=usuarios).delete()
+                if modo == 'http':
+                    resultado = self._medir_http(options['url'], ruta, usuarios, cuerpos)
+                elif modo == 'asgi':
+                    resultado = self._medir_asgi(ruta, usuarios, cuerpos)
+                else:
+                    resultado = self._medir_wsgi(ruta, usuarios, cuerpos)
+                resultados.append(resultado)
+                estilo = self.style.WARNING if resultado['errores'] else self.style.SUCCESS
+                self.stdout.write(estilo(
+                    f"{resultado['modo']:<6} {resultado['peticiones']:>6} peticiones en {resultado['duracion_s']:.2f}s: "
+                    f"{resultado['peticiones_por_segundo']:.1f} req/s, p50 {resultado['p50_ms']:.1f} ms, "
+                    f"p95 {resultado['p95_ms']:.1f} ms, {resultado['errores']} error(es) {' '.join(resultado['codigos_error'])}"
+                ))
+        finally:
+            User.objects.filter(pk__in=[usuario.pk for usuario in usuarios]).delete()
+
+        if options['salida_json']:
+            informe = {
+                'fecha': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'base_de_datos': connections['default'].vendor,
+                'guia': guia.pk,
+                'usuarios': cantidad,
+                'guardados_por_usuario': guardados,
+                'resultados': resultados,
+            }
+            with open(options['salida_json'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida_json']}"))
+
+    def _crear_usuarios(self, cantidad):
+        """Crea los usuarios de prueba del generador de carga (se eliminan al terminar)."""
+        User.objects.filter(username__startswith=PREFIJO_USUARIOS).delete()
+        usuarios = []
+        for indice in range(cantidad):
+            usuario = User(username=f'{PREFIJO_USUARIOS}{indice}')
+            usuario.set_unusable_password()
+            usuario.save()
+            usuarios.append(usuario)
+        return usuarios
+
+    def _medir_asgi(self, ruta, usuarios, cuerpos):
+        """Usuarios concurrentes como corrutinas sobre el manejador ASGI del proceso."""
+        clientes = []
+        for usuario in usuarios:
+            cliente = AsyncClient(raise_request_exception=False)
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+        latencias, errores = [], []
+
+        async def usuario_autoguardando(cliente, cuerpos_usuario):
+            for cuerpo in cuerpos_usuario:
+                inicio = time.perf_counter()
+                respuesta = await cliente.post(ruta, cuerpo, content_type='application/json')
+                latencias.append(time.perf_counter() - inicio)
+                if respuesta.status_code != 200:
+                    errores.append(respuesta.status_code)
+
+        async def carga():
+            await asyncio.gather(*(
+                usuario_autoguardando(cliente, cuerpos_usuario) for cliente, cuerpos_usuario in zip(clientes, cuerpos)
+            ))
+            # Las conexiones abiertas por el hilo síncrono de asgiref se cierran en ese mismo hilo
+            await sync_to_async(connections.close_all)()
+
+        inicio = time.perf_counter()
+        asyncio.run(carga())
+        return _resumen('asgi', latencias, errores, time.perf_counter() - inicio)
+
+    def _medir_wsgi(self, ruta, usuarios, cuerpos):
+        """Usuarios concurrentes como hilos sobre el manejador WSGI del proceso."""
+        clientes = []
+        for usuario in usuarios:
+            cliente = Client(raise_request_exception=False)
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+        latencias, errores = [], []
+
+        def usuario_autoguardando(cliente, cuerpos_usuario):
+            try:
+                for cuerpo in cuerpos_usuario:
+                    inicio = time.perf_counter()
+                    respuesta = cliente.post(ruta, cuerpo, content_type='application/json')
+                    latencias.append(time.perf_counter() - inicio)
+                    if respuesta.status_code != 200:
+                        errores.append(respuesta.status_code)
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clientes)) as pool:
+            list(pool.map(usuario_autoguardando, clientes, cuerpos))
+        return _resumen('wsgi', latencias, errores, time.perf_counter() - inicio)
+
+    def _medir_http(self, url, ruta, usuarios, cuerpos):
+        """Usuarios concurrentes, cada uno con su conexión HTTP keep-alive, contra un servidor externo."""
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        backend = settings.AUTHENTICATION_BACKENDS[0] if hasattr(settings, 'AUTHENTICATION_BACKENDS') else 'django.contrib.auth.backends.ModelBackend'
+        cabeceras = []
+        for usuario in usuarios:
+            sesion = SessionStore()
+            sesion[SESSION_KEY] = str(usuario.pk)
+            sesion[BACKEND_SESSION_KEY] = backend
+            sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+            sesion.create()
+            csrf = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+            cabeceras.append({
+                'Content-Type': 'application/json',
+                'Cookie': f'{settings.SESSION_COOKIE_NAME}={sesion.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}',
+                'X-CSRFToken': csrf,
+            })
+        partes = urlsplit(url)
+        clase_conexion = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        prefijo = partes.path.rstrip('/')
+        latencias, errores = [], []
+
+        def usuario_autoguardando(cabeceras_usuario, cuerpos_usuario):
+            conexion = clase_conexion(partes.hostname, partes.port, timeout=30)
+            try:
+                for cuerpo in cuerpos_usuario:
+                    inicio = time.perf_counter()
+                    try:
+                        conexion.request('POST', prefijo + ruta, body=cuerpo.encode('utf-8'), headers=cabeceras_usuario)
+                        respuesta = conexion.getresponse()
+                        respuesta.read()
+                        estado = respuesta.status
+                    except (OSError, http.client.HTTPException) as e:
+                        estado = type(e).__name__
+                        conexion.close()
+                        conexion = clase_conexion(partes.hostname, partes.port, timeout=30)
+                    latencias.append(time.perf_counter() - inicio)
+                    if estado != 200:
+                        errores.append(estado)
+            finally:
+                conexion.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(usuarios)) as pool:
+            list(pool.map(usuario_autoguardando, cabeceras, cuerpos))
+        return _resumen('http', latencias, errores, time.perf_counter() - inicio)
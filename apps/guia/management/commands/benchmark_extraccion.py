@@ -0,0 +1,364 @@
+"""
+Comando para medir el rendimiento de la extracción de guías sobre los .docx de media/archivos.
+Por defecto compara los backends de lectura; --clasificacion mide el motor de reglas y
+--etapas mide tiempo y memoria de cada etapa del pipeline, con variantes ampliadas y salida JSON.
+"""
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from apps.dashboard.models import Archivo
+from apps.guia.models import GuiaAutocontrol
+from apps.guia.extraccion import (
+    backend_docx,
+    cargar_documento,
+    cargar_documento_docx,
+    cargar_documento_docx_streaming,
+    iterar_filas_docx,
+)
+from docx import Document
+import copy
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+ETAPAS = ['apertura', 'documento', 'texto', 'cuestionario', 'proposito', 'json', 'guardado']
+
+
+def _medir(funcion, repeticiones):
+    """Ejecuta la función varias veces y devuelve (resultado, tiempos en ms)."""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return resultado, tiempos
+
+
+def _medir_pico_memoria(funcion):
+    """Ejecuta la función una vez con tracemalloc y devuelve el pico de memoria en KiB."""
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _crear_variante_ampliada(ruta, factor, directorio):
+    """
+    Crea una copia del .docx con las filas de cuestionario (entre el encabezado y el
+    cierre) repetidas `factor` veces y devuelve su ruta.
+    """
+    doc = Document(ruta)
+    for tabla in doc.tables:
+        filas = [fila._tr for fila in tabla.rows]
+        cierre = next(
+            (tr for fila, tr in zip(tabla.rows, filas) if fila.cells and 'Elaborado y aprobado' in fila.cells[0].text),
+            None
+        )
+        cuerpo = [tr for tr in filas[1:] if tr is not cierre]
+        for _ in range(factor - 1):
+            for tr in cuerpo:
+                nueva = copy.deepcopy(tr)
+                if cierre is not None:
+                    cierre.addprevious(nueva)
+                else:
+                    tabla._tbl.append(nueva)
+    nombre, extension = os.path.splitext(os.path.basename(ruta))
+    destino = os.path.join(directorio, f'{nombre}_x{factor}{extension}')
+    doc.save(destino)
+    return destino
+
+
+def _limpiar_texto_referencia(texto):
+    """Limpieza de celdas previa al motor de reglas (regex sin compilar y codificación por celda)."""
+    if not isinstance(texto, str):
+        return str(texto)
+    texto = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', texto)
+    texto = re.sub(r'\s+', ' ', texto)
+    try:
+        texto = texto.encode('utf-8').decode('utf-8')
+    except UnicodeEncodeError:
+        texto = texto.encode('ascii', 'ignore').decode('ascii')
+    return texto.strip()
+
+
+def _parsear_filas_referencia(filas):
+    """
+    Clasificación de filas previa al motor de reglas, conservada solo como referencia
+    para la micro-medición: cada regla recorre las celdas con `re` sin compilar.
+    """
+    limpiar = _limpiar_texto_referencia
+    tablas_cuestionario = []
+    componente_actual = None
+    dentro_tabla_cuestionario = False
+    componentes_procesados = set()
+    bloque = None
+    contador_preguntas = 0
+    for fila in filas:
+        celdas = [limpiar(texto) if texto else "" for texto in fila]
+        if not any(c for c in celdas if c):
+            continue
+        if any("ASPECTOS A VERIFICAR" in c.upper() for c in celdas if c):
+            dentro_tabla_cuestionario = True
+            continue
+        if not dentro_tabla_cuestionario:
+            continue
+        if celdas and "Elaborado y aprobado" in celdas[0]:
+            break
+        if (len(celdas) >= 3 and len(set(c for c in celdas if c)) == 1 and celdas[0]
+                and limpiar(celdas[0]) not in componentes_procesados):
+            componente_actual = {"componente_a_evaluar": limpiar(celdas[0]), "bloques": []}
+            tablas_cuestionario.append(componente_actual)
+            componentes_procesados.add(limpiar(celdas[0]))
+            bloque = None
+            continue
+        if componente_actual and any(re.search(r":\s*$", c) for c in celdas if c):
+            encabezado = next((limpiar(c) for c in celdas if re.search(r":\s*$", c)), None)
+            if encabezado:
+                bloque = {"encabezado": encabezado, "preguntas": []}
+                componente_actual["bloques"].append(bloque)
+            continue
+        if componente_actual and bloque and len(celdas) > 1:
+            texto_celda = celdas[1].strip()
+            if re.match(r"^\d+\.?\s*.+", texto_celda):
+                contador_preguntas += 1
+                bloque["preguntas"].append({
+                    "numero_pregunta": contador_preguntas,
+                    "texto": re.sub(r"^\d+\.?\s*", "", texto_celda).strip()
+                })
+    return tablas_cuestionario
+
+
+class Command(BaseCommand):
+    help = 'Compara los backends de lectura de .docx (python-docx y streaming) sobre las guías de media/archivos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directorio',
+            default=os.path.join(settings.MEDIA_ROOT, 'archivos'),
+            help='Directorio con las guías .docx a medir'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=5,
+            help='Número de repeticiones por archivo y backend'
+        )
+        parser.add_argument(
+            '--clasificacion',
+            action='store_true',
+            help='Micro-medición de la clasificación de filas: referencia previa frente al motor de reglas'
+        )
+        parser.add_argument(
+            '--etapas',
+            action='store_true',
+            help='Mide tiempo y pico de memoria de cada etapa del pipeline de extracción'
+        )
+        parser.add_argument(
+            '--ampliaciones',
+            type=int,
+            nargs='*',
+            default=[10, 100],
+            help='Factores de ampliación de filas para las variantes sintéticas (con --etapas)'
+        )
+        parser.add_argument(
+            '--json',
+            dest='salida_json',
+            help='Ruta del archivo JSON donde guardar los resultados (con --etapas)'
+        )
+
+    def handle(self, *args, **options):
+        rutas = sorted(glob.glob(os.path.join(options['directorio'], '*.docx')))
+        repeticiones = max(1, options['repeticiones'])
+        guia = GuiaAutocontrol()
+
+        if options['clasificacion']:
+            self._medir_clasificacion(rutas, repeticiones, guia)
+            return
+
+        if options['etapas']:
+            self._medir_etapas(rutas, repeticiones, guia, options['ampliaciones'], options['salida_json'])
+            return
+
+        self.stdout.write(self.style.NOTICE(
+            f'Comparando backends sobre {len(rutas)} archivo(s), {repeticiones} repetición(es)'
+        ))
+        self.stdout.write(f"{'archivo':<50} {'etapa':<13} {'python-docx':>12} {'streaming':>12} {'mejora':>8}")
+
+        for ruta in rutas:
+            nombre = os.path.basename(ruta)
+            if not zipfile.is_zipfile(ruta):
+                self.stdout.write(self.style.WARNING(f'{nombre}: no es un .docx válido, se omite'))
+                continue
+
+            documento_docx, tiempos_docx = _medir(lambda: cargar_documento_docx(ruta), repeticiones)
+            documento_stream, tiempos_stream = _medir(lambda: cargar_documento_docx_streaming(ruta), repeticiones)
+            self._reportar(nombre, 'documento', tiempos_docx, tiempos_stream)
+
+            cuestionario_docx, tiempos_docx = _medir(
+                lambda: guia._parsear_filas_cuestionario(cargar_documento_docx(ruta).filas()), repeticiones
+            )
+            cuestionario_stream, tiempos_stream = _medir(
+                lambda: guia._parsear_filas_cuestionario(iterar_filas_docx(ruta)), repeticiones
+            )
+            self._reportar(nombre, 'cuestionario', tiempos_docx, tiempos_stream)
+
+            iguales = (
+                documento_docx.parrafos == documento_stream.parrafos
+                and documento_docx.tablas == documento_stream.tablas
+                and cuestionario_docx == cuestionario_stream
+            )
+            if not iguales:
+                self.stdout.write(self.style.ERROR(f'{nombre}: los backends producen resultados distintos'))
+
+    def _medir_etapas(self, rutas, repeticiones, guia, ampliaciones, salida_json):
+        """Recorre los archivos y sus variantes ampliadas midiendo cada etapa del pipeline."""
+        self.stdout.write(self.style.NOTICE(
+            f'Etapas de extracción ({backend_docx()}) sobre {len(rutas)} archivo(s), '
+            f'ampliaciones {ampliaciones}, {repeticiones} repetición(es)'
+        ))
+        self.stdout.write(f"{'archivo':<50} {'filas':>7} " + ' '.join(f'{etapa:>12}' for etapa in ETAPAS))
+        resultados = []
+        directorio = tempfile.mkdtemp(prefix='benchmark_extraccion_')
+        try:
+            for ruta in rutas:
+                nombre = os.path.basename(ruta)
+                if not zipfile.is_zipfile(ruta):
+                    self.stdout.write(self.style.WARNING(f'{nombre}: no es un .docx válido, se omite'))
+                    continue
+                variantes = [(1, ruta)] + [
+                    (factor, _crear_variante_ampliada(ruta, factor, directorio)) for factor in ampliaciones if factor > 1
+                ]
+                for factor, ruta_variante in variantes:
+                    resultado = self._medir_pipeline(ruta_variante, repeticiones, guia)
+                    resultado.update({'archivo': nombre, 'ampliacion': factor})
+                    resultados.append(resultado)
+                    sufijo = '' if factor == 1 else f' x{factor}'
+                    etiqueta = nombre[:50 - len(sufijo)] + sufijo
+                    self.stdout.write(f"{etiqueta:<50} {resultado['filas']:>7} " + ' '.join(
+                        f"{resultado['etapas'][etapa]['mediana_ms']:>10.2f}ms" for etapa in ETAPAS
+                    ))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        if salida_json:
+            informe = {
+                'fecha': timezone.now().isoformat(),
+                'backend_docx': backend_docx(),
+                'python': platform.python_version(),
+                'repeticiones': repeticiones,
+                'resultados': resultados,
+            }
+            with open(salida_json, 'w', encoding='utf-8') as f:
+                json.dump(informe, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida_json}'))
+
+    def _medir_pipeline(self, ruta, repeticiones, guia):
+        """Mide cada etapa de la extracción de un archivo; cada etapa recibe la salida de la anterior."""
+        def apertura():
+            with zipfile.ZipFile(ruta) as paquete:
+                return paquete.read('word/document.xml')
+
+        documento = cargar_documento(ruta)
+        texto = documento.texto_completo()
+        datos = {
+            'componente': guia._extraer_componente(texto),
+            'proposito': guia._extraer_y_limpiar_proposito(texto),
+            'tablas_cuestionario': guia._parsear_filas_cuestionario(documento.filas()),
+        }
+        funciones = {
+            'apertura': apertura,
+            'documento': lambda: cargar_documento(ruta),
+            'texto': documento.texto_completo,
+            'cuestionario': lambda: guia._parsear_filas_cuestionario(documento.filas()),
+            'proposito': lambda: (guia._extraer_componente(texto), guia._extraer_y_limpiar_proposito(texto)),
+            'json': lambda: json.dumps(guia._procesar_estructura_para_json(datos)),
+            'guardado': lambda: self._guardar_y_revertir(archivo_base, datos),
+        }
+        # El guardado usa una copia del archivo en el almacenamiento para que GuiaAutocontrol.save()
+        # recorra su camino real (huella y hash del archivo, índice, cache y señales)
+        storage = Archivo._meta.get_field('archivo').storage
+        with open(ruta, 'rb') as f:
+            nombre_almacenado = storage.save(f'benchmark/{os.path.basename(ruta)}', File(f))
+        archivo_base = Archivo(nombre=os.path.basename(ruta), archivo=nombre_almacenado, tipo='documento')
+        archivo_base.obtener_hash()
+        etapas = {}
+        try:
+            for etapa in ETAPAS:
+                _, tiempos = _medir(funciones[etapa], repeticiones)
+                etapas[etapa] = {
+                    'mediana_ms': round(statistics.median(tiempos), 3),
+                    'minimo_ms': round(min(tiempos), 3),
+                    'pico_kib': round(_medir_pico_memoria(funciones[etapa]), 1),
+                }
+        finally:
+            storage.delete(nombre_almacenado)
+        return {'filas': sum(len(tabla) for tabla in documento.tablas), 'etapas': etapas}
+
+    def _guardar_y_revertir(self, archivo_base, datos):
+        """
+        Guarda el archivo y la guía con el contenido extraído mediante GuiaAutocontrol.save()
+        dentro de una transacción que se revierte, de modo que la base de datos no cambia.
+        `archivo_base` apunta a una copia ya almacenada, con su hash y huella calculados
+        como los deja una subida normal.
+        """
+        with transaction.atomic():
+            usuario, _ = get_user_model().objects.get_or_create(username='benchmark_extraccion')
+            archivo = Archivo.objects.create(
+                nombre=archivo_base.nombre,
+                archivo=archivo_base.archivo.name,
+                tipo='documento',
+                subido_por=usuario,
+                hash_sha256=archivo_base.hash_sha256,
+                tamano_archivo=archivo_base.tamano_archivo,
+                fecha_modificacion_archivo=archivo_base.fecha_modificacion_archivo,
+            )
+            GuiaAutocontrol(
+                archivo=archivo,
+                titulo_guia=archivo.nombre,
+                componente=datos['componente'],
+                proposito=datos['proposito'],
+                contenido_procesado=datos,
+                estado_procesamiento='lista',
+            ).save()
+            transaction.set_rollback(True)
+
+    def _medir_clasificacion(self, rutas, repeticiones, guia):
+        """Mide solo la limpieza y clasificación de filas, con las filas ya leídas en memoria."""
+        self.stdout.write(self.style.NOTICE(
+            f'Clasificación de filas sobre {len(rutas)} archivo(s), {repeticiones} repetición(es)'
+        ))
+        self.stdout.write(f"{'archivo':<50} {'etapa':<13} {'referencia':>12} {'motor':>12} {'mejora':>8}")
+        for ruta in rutas:
+            nombre = os.path.basename(ruta)
+            if not zipfile.is_zipfile(ruta):
+                self.stdout.write(self.style.WARNING(f'{nombre}: no es un .docx válido, se omite'))
+                continue
+            filas = list(iterar_filas_docx(ruta))
+            referencia, tiempos_referencia = _medir(lambda: _parsear_filas_referencia(filas), repeticiones)
+            motor, tiempos_motor = _medir(lambda: guia._parsear_filas_cuestionario(filas), repeticiones)
+            self._reportar(nombre, 'clasificacion', tiempos_referencia, tiempos_motor)
+            if referencia != motor:
+                self.stdout.write(self.style.ERROR(f'{nombre}: el motor de reglas produce un resultado distinto'))
+
+    def _reportar(self, nombre, etapa, tiempos_docx, tiempos_stream):
+        """Escribe la mediana de cada variante y la mejora relativa de la segunda."""
+        mediana_docx = statistics.median(tiempos_docx)
+        mediana_stream = statistics.median(tiempos_stream)
+        mejora = (1 - mediana_stream / mediana_docx) * 100 if mediana_docx else 0
+        self.stdout.write(
+            f'{nombre[:50]:<50} {etapa:<13} {mediana_docx:>10.2f}ms {mediana_stream:>10.2f}ms {mejora:>7.1f}%'
+        )
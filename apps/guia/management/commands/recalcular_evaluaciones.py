@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from apps.guia.models import EvaluacionGuia
+import logging
+
+
+class Command(BaseCommand):
+    help = 'Recalcula por completo los contadores y el JSON de respuestas de las evaluaciones (reparación)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--guia',
+            type=int,
+            help='ID de la guía cuyas evaluaciones se recalculan (opcional)'
+        )
+        parser.add_argument(
+            '--usuario',
+            type=int,
+            help='ID del usuario cuyas evaluaciones se recalculan (opcional)'
+        )
+        parser.add_argument(
+            '--sin-json',
+            action='store_true',
+            help='Recalcula solo los contadores, sin regenerar respuestas_json'
+        )
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('django')
+        evaluaciones = EvaluacionGuia.objects.select_related('guia')
+        if options.get('guia'):
+            evaluaciones = evaluaciones.filter(guia_id=options['guia'])
+        if options.get('usuario'):
+            evaluaciones = evaluaciones.filter(usuario_id=options['usuario'])
+
+        total = evaluaciones.count()
+        corregidas = 0
+        self.stdout.write(self.style.NOTICE(f'Recalculando {total} evaluación(es)...'))
+        for evaluacion in evaluaciones.iterator():
+            antes = (
+                evaluacion.total_respuestas, evaluacion.respuestas_si, evaluacion.respuestas_no,
+                evaluacion.respuestas_na, evaluacion.porcentaje_cumplimiento, evaluacion.estado,
+            )
+            evaluacion.actualizar_estadisticas()
+            if not options.get('sin_json'):
+                evaluacion.actualizar_respuestas_json()
+            despues = (
+                evaluacion.total_respuestas, evaluacion.respuestas_si, evaluacion.respuestas_no,
+                evaluacion.respuestas_na, evaluacion.porcentaje_cumplimiento, evaluacion.estado,
+            )
+            if antes != despues:
+                corregidas += 1
+                self.stdout.write(self.style.WARNING(f'Evaluación {evaluacion.pk}: {antes} -> {despues}'))
+                logger.info(f'Evaluación {evaluacion.pk} corregida: {antes} -> {despues}')
+
+        self.stdout.write(self.style.SUCCESS(f'¡Recálculo completado! {corregidas} de {total} evaluación(es) corregida(s)'))
@@ -1,6 +1,69 @@
 from django.core.management.base import BaseCommand
-from apps.guia.models import GuiaAutocontrol
+from django.db import connections
+from django.utils import timezone
+from apps.guia.models import GuiaAutocontrol, CacheExtraccion, VERSION_PARSER
+from apps.guia.indice import construir_indice_preguntas
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
 import logging
+import time
+
+CAMPOS_ACTUALIZADOS = [
+    'componente', 'proposito', 'contenido_procesado', 'hash_archivo', 'total_preguntas',
+    'categorias_count', 'indice_preguntas', 'estado_procesamiento', 'error_procesamiento', 'duracion_procesamiento',
+    'fecha_procesamiento',
+]
+
+
+def _inicializar_worker():
+    """Prepara Django en cada proceso hijo; las conexiones heredadas no se reutilizan."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _hash_ruta(ruta):
+    """Calcula el hash SHA-256 de un archivo del disco."""
+    hash_obj = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def procesar_guia_aislada(tarea):
+    """
+    Procesa una guía sin escribir en la base de datos y devuelve solo datos planos.
+    Se ejecuta tanto en el proceso principal como en los procesos del pool.
+    """
+    inicio = time.perf_counter()
+    resultado = {'pk': tarea['pk'], 'origen': 'parseada', 'datos': None, 'error': ''}
+    try:
+        # Solo se relee el archivo si su huella cambió desde el último hash guardado
+        hash_actual = tarea['hash_conocido'] or _hash_ruta(tarea['ruta'])
+        resultado['hash'] = hash_actual
+        if tarea['solo_cambios'] and hash_actual == tarea['hash_guardado']:
+            resultado['origen'] = 'sin cambios'
+        else:
+            entrada = None
+            if tarea['usar_cache']:
+                entrada = CacheExtraccion.objects.filter(
+                    hash_archivo=hash_actual,
+                    version_parser=VERSION_PARSER
+                ).values('contenido_procesado').first()
+            if entrada:
+                resultado['origen'] = 'cache'
+                resultado['datos'] = entrada['contenido_procesado']
+            else:
+                resultado['datos'] = GuiaAutocontrol()._extraer_datos_archivo(tarea['ruta'])
+    except Exception as e:
+        resultado['origen'] = 'error'
+        resultado['error'] = str(e)
+    resultado['duracion'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
 
 class Command(BaseCommand):
     help = 'Reprocesa el contenido de todas las guías de autocontrol o una guía específica por ID'
@@ -12,6 +75,33 @@ class Command(BaseCommand):
             type=int,
             help='ID de la guía a reprocesar (opcional, si no se indica se reprocesan todas)'
         )
+        parser.add_argument(
+            '--sin-cache',
+            action='store_true',
+            help='Ignora el cache de extracción y vuelve a parsear todos los archivos'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Número de procesos que parsean documentos en paralelo (por defecto 1, sin pool)'
+        )
+        parser.add_argument(
+            '--only-changed',
+            action='store_true',
+            help='Omite las guías cuyo archivo conserva el mismo hash SHA-256'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Procesa y reporta tiempos sin guardar cambios en la base de datos'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=50,
+            help='Cantidad de guías escritas por cada bulk_update'
+        )
 
     def handle(self, *args, **options):
         logger = logging.getLogger('django')
@@ -23,18 +113,121 @@ class Command(BaseCommand):
                 return
         else:
             guias = GuiaAutocontrol.objects.all()
-        total = guias.count()
-        self.stdout.write(self.style.NOTICE(f'Reprocesando {total} guía(s)...'))
-        logger.info(f'Reprocesando {total} guía(s)...')
-        for guia in guias:
-            self.stdout.write(f"[DEBUG] Entrando a extraer_contenido_archivo para la guía: {guia.pk}")
-            try:
-                guia.extraer_contenido_archivo()
-                guia.save()
-                self.stdout.write(self.style.SUCCESS(f'Guía {guia.pk} procesada'))
-                logger.info(f'Guía {guia.pk} procesada')
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error procesando guía {guia.pk}: {e}'))
-                logger.error(f'Error procesando guía {guia.pk}: {e}')
-        self.stdout.write(self.style.SUCCESS('¡Reprocesamiento completado!'))
-        logger.info('¡Reprocesamiento completado!')
+        guias = {guia.pk: guia for guia in guias.select_related('archivo').exclude(archivo__archivo='')}
+
+        self.usar_cache = not options.get('sin_cache')
+        self.dry_run = options.get('dry_run')
+        if not self.dry_run:
+            purgadas = CacheExtraccion.purgar_obsoletas()
+            if purgadas:
+                self.stdout.write(self.style.NOTICE(f'Eliminadas {purgadas} entrada(s) del cache de extracción de versiones anteriores del parser'))
+                logger.info(f'Eliminadas {purgadas} entrada(s) del cache de extracción de versiones anteriores del parser')
+        self.huellas = {guia.pk: guia.archivo.huella_archivo() for guia in guias.values()}
+        tareas = [
+            {
+                'pk': guia.pk,
+                'ruta': guia.archivo.archivo.path,
+                'hash_conocido': guia.archivo.hash_vigente(self.huellas[guia.pk]),
+                'hash_guardado': guia.hash_archivo if guia.contenido_procesado else None,
+                'solo_cambios': options.get('only_changed'),
+                'usar_cache': self.usar_cache,
+            }
+            for guia in guias.values()
+        ]
+        workers = max(1, options.get('workers') or 1)
+        lote = max(1, options.get('lote') or 50)
+
+        total = len(tareas)
+        self.stdout.write(self.style.NOTICE(f'Reprocesando {total} guía(s) con {workers} worker(s)...'))
+        logger.info(f'Reprocesando {total} guía(s) con {workers} worker(s)...')
+
+        inicio = time.perf_counter()
+        pendientes = []
+        resumen = {'parseada': 0, 'cache': 0, 'sin cambios': 0, 'error': 0}
+        for resultado in self._resultados(tareas, workers):
+            resumen[resultado['origen']] += 1
+            self._registrar_hash(guias[resultado['pk']], resultado)
+            self._reportar(resultado, logger)
+            if resultado['origen'] != 'sin cambios':
+                pendientes.append(resultado)
+            if len(pendientes) >= lote:
+                self._guardar_lote(guias, pendientes)
+                pendientes = []
+        self._guardar_lote(guias, pendientes)
+
+        duracion = time.perf_counter() - inicio
+        detalle = ', '.join(f'{cantidad} {origen}' for origen, cantidad in resumen.items())
+        sufijo = ' (dry-run, sin cambios guardados)' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(f'¡Reprocesamiento completado en {duracion:.2f}s! {detalle}{sufijo}'))
+        logger.info(f'¡Reprocesamiento completado en {duracion:.2f}s! {detalle}{sufijo}')
+
+    def _resultados(self, tareas, workers):
+        """Genera los resultados en el proceso actual o en un pool de procesos."""
+        if workers == 1 or len(tareas) <= 1:
+            for tarea in tareas:
+                yield procesar_guia_aislada(tarea)
+            return
+        # Las conexiones abiertas no deben compartirse con los procesos hijos
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool:
+            futuros = [pool.submit(procesar_guia_aislada, tarea) for tarea in tareas]
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+
+    def _registrar_hash(self, guia, resultado):
+        """Guarda en el archivo el hash recalculado para que la próxima ejecución no vuelva a leerlo."""
+        hash_actual = resultado.get('hash')
+        if self.dry_run or not hash_actual or hash_actual == guia.archivo.hash_vigente(self.huellas[guia.pk]):
+            return
+        guia.archivo.registrar_hash(hash_actual, self.huellas[guia.pk])
+
+    def _reportar(self, resultado, logger):
+        """Muestra el tiempo y el origen del resultado de cada guía."""
+        mensaje = f"Guía {resultado['pk']}: {resultado['origen']} en {resultado['duracion'] * 1000:.0f} ms"
+        if resultado['error']:
+            self.stdout.write(self.style.ERROR(f"{mensaje} - {resultado['error']}"))
+            logger.error(f"Error procesando guía {resultado['pk']}: {resultado['error']}")
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje))
+            logger.info(mensaje)
+
+    def _guardar_lote(self, guias, resultados):
+        """Escribe un lote de resultados con un único bulk_update y registra las nuevas extracciones en el cache."""
+        if not resultados or self.dry_run:
+            return
+        ahora = timezone.now()
+        actualizadas = []
+        nuevas_entradas_cache = []
+        for resultado in resultados:
+            guia = guias[resultado['pk']]
+            guia.duracion_procesamiento = resultado['duracion']
+            guia.fecha_procesamiento = ahora
+            if resultado['error']:
+                guia.estado_procesamiento = 'fallida'
+                guia.error_procesamiento = resultado['error']
+            else:
+                datos = resultado['datos']
+                guia.componente = datos['componente']
+                guia.proposito = datos['proposito']
+                guia.contenido_procesado = datos
+                guia.hash_archivo = resultado['hash']
+                guia.indice_preguntas = construir_indice_preguntas(datos)
+                guia.__dict__.pop('_indice', None)
+                guia.total_preguntas = guia._calcular_total_preguntas()
+                guia.categorias_count = len(datos.get('tablas_cuestionario', []))
+                guia.estado_procesamiento = 'lista'
+                guia.error_procesamiento = ''
+                if resultado['origen'] == 'parseada':
+                    nuevas_entradas_cache.append(CacheExtraccion(
+                        hash_archivo=resultado['hash'],
+                        version_parser=VERSION_PARSER,
+                        componente=datos['componente'],
+                        proposito=datos['proposito'],
+                        contenido_procesado=datos,
+                    ))
+            actualizadas.append(guia)
+
+        GuiaAutocontrol.objects.bulk_update(actualizadas, CAMPOS_ACTUALIZADOS)
+        if nuevas_entradas_cache:
+            CacheExtraccion.objects.bulk_create(nuevas_entradas_cache, ignore_conflicts=True)
+        GuiaAutocontrol.invalidar_cache(*(guia.pk for guia in actualizadas))
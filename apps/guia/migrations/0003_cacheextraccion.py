@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0002_evaluacionguia_respuestas_json"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheExtraccion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hash_archivo", models.CharField(max_length=64)),
+                ("version_parser", models.CharField(max_length=20)),
+                ("componente", models.CharField(blank=True, max_length=200)),
+                ("proposito", models.TextField(blank=True)),
+                ("contenido_procesado", models.JSONField(blank=True, default=dict)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Cache de Extracción",
+                "verbose_name_plural": "Cache de Extracciones",
+                "unique_together": {("hash_archivo", "version_parser")},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+def marcar_guias_existentes_como_listas(apps, schema_editor):
+    # Las guías existentes ya se procesaron de forma síncrona al subirse
+    GuiaAutocontrol = apps.get_model("guia", "GuiaAutocontrol")
+    GuiaAutocontrol.objects.update(estado_procesamiento="lista")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0003_cacheextraccion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="guiaautocontrol",
+            name="duracion_procesamiento",
+            field=models.FloatField(
+                blank=True,
+                help_text="Segundos empleados en la última extracción",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="guiaautocontrol",
+            name="error_procesamiento",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="guiaautocontrol",
+            name="estado_procesamiento",
+            field=models.CharField(
+                choices=[
+                    ("pendiente", "Pendiente"),
+                    ("procesando", "Procesando"),
+                    ("lista", "Lista"),
+                    ("fallida", "Fallida"),
+                ],
+                default="pendiente",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="guiaautocontrol",
+            index=models.Index(
+                fields=["activa", "estado_procesamiento"],
+                name="guia_guiaau_activa_0f8261_idx",
+            ),
+        ),
+        migrations.RunPython(marcar_guias_existentes_como_listas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0004_guiaautocontrol_estado_procesamiento"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="evaluacionguia",
+            name="respuestas_json_pendiente",
+            field=models.BooleanField(
+                default=True,
+                help_text="Indica que respuestas_json está desactualizado y debe reconstruirse al leerse",
+            ),
+        ),
+    ]
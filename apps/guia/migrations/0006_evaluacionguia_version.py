@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0005_evaluacionguia_respuestas_json_pendiente"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="evaluacionguia",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
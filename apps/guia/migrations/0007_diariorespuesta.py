@@ -0,0 +1,74 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("guia", "0006_evaluacionguia_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiarioRespuesta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("numero_pregunta", models.IntegerField()),
+                (
+                    "respuesta",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("si", "Sí"),
+                            ("no", "No"),
+                            ("na", "No Aplica"),
+                            ("", "Sin Responder"),
+                        ],
+                        max_length=4,
+                        null=True,
+                    ),
+                ),
+                ("fundamentacion", models.TextField(blank=True)),
+                ("fecha_registro", models.DateTimeField(auto_now_add=True)),
+                (
+                    "guia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="diario_respuestas",
+                        to="guia.guiaautocontrol",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="diario_respuestas",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Entrada del Diario de Respuestas",
+                "verbose_name_plural": "Diario de Respuestas",
+                "ordering": ["pk"],
+                "indexes": [
+                    models.Index(
+                        fields=["guia", "usuario"],
+                        name="guia_diario_guia_id_41a0c1_idx",
+                    )
+                ],
+            },
+        ),
+    ]
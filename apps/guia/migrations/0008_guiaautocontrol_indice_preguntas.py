@@ -0,0 +1,60 @@
+# Generated by Django 4.2.23 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+# Copia de apps.guia.indice.construir_indice_preguntas (versión 1 del índice) tal como
+# estaba al crear la migración: la migración no debe cambiar si el módulo evoluciona.
+def construir_indice_preguntas(contenido):
+    indice = {
+        "version": 1,
+        "preguntas": [],
+        "componentes": [],
+        "bloques": [],
+        "componente_de": [],
+        "bloque_de": [],
+        "total_por_componente": [],
+    }
+    for componente in (contenido or {}).get("tablas_cuestionario", []):
+        posicion_componente = len(indice["componentes"])
+        indice["componentes"].append(componente.get("componente_a_evaluar", ""))
+        total = 0
+        for bloque in componente.get("bloques", []):
+            posicion_bloque = len(indice["bloques"])
+            indice["bloques"].append(bloque.get("encabezado", ""))
+            for pregunta in bloque.get("preguntas", []):
+                indice["preguntas"].append(pregunta.get("numero_pregunta"))
+                indice["componente_de"].append(posicion_componente)
+                indice["bloque_de"].append(posicion_bloque)
+                total += 1
+        indice["total_por_componente"].append(total)
+    return indice
+
+
+def construir_indices_existentes(apps, schema_editor):
+    GuiaAutocontrol = apps.get_model("guia", "GuiaAutocontrol")
+    guias = list(GuiaAutocontrol.objects.only("pk", "contenido_procesado"))
+    for guia in guias:
+        guia.indice_preguntas = construir_indice_preguntas(guia.contenido_procesado)
+    GuiaAutocontrol.objects.bulk_update(guias, ["indice_preguntas"], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0007_diariorespuesta"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="guiaautocontrol",
+            name="indice_preguntas",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Índice compacto del cuestionario: orden de preguntas, componente y bloque de cada una",
+            ),
+        ),
+        migrations.RunPython(construir_indices_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0008_guiaautocontrol_indice_preguntas"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="evaluacionguia",
+            name="vector_respuestas",
+            field=models.BinaryField(
+                blank=True,
+                default=b"",
+                help_text="Un código por pregunta (ver vectores.py) en el orden del índice de la guía",
+            ),
+        ),
+    ]
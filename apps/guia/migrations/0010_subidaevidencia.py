@@ -0,0 +1,90 @@
+# Generated by Django 4.2.23 on 2026-10-18 17:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0003_archivo_hash_huella"),
+        ("guia", "0009_evaluacionguia_vector_respuestas"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubidaEvidencia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ("numero_pregunta", models.IntegerField()),
+                ("nombre", models.CharField(max_length=255)),
+                ("tamano_total", models.BigIntegerField()),
+                ("recibidos", models.BigIntegerField(default=0)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("en_curso", "En curso"),
+                            ("completada", "Completada"),
+                        ],
+                        default="en_curso",
+                        max_length=20,
+                    ),
+                ),
+                ("fecha_inicio", models.DateTimeField(auto_now_add=True)),
+                ("fecha_actualizacion", models.DateTimeField(auto_now=True)),
+                (
+                    "archivo",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="subidas_evidencias",
+                        to="dashboard.archivo",
+                    ),
+                ),
+                (
+                    "guia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subidas_evidencias",
+                        to="guia.guiaautocontrol",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subidas_evidencias",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Subida de Evidencia",
+                "verbose_name_plural": "Subidas de Evidencias",
+                "ordering": ["-fecha_inicio"],
+                "indexes": [
+                    models.Index(
+                        fields=["guia", "usuario", "numero_pregunta"],
+                        name="guia_subida_guia_id_6dfa88_idx",
+                    )
+                ],
+            },
+        ),
+    ]
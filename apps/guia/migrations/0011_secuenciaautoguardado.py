@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("guia", "0010_subidaevidencia"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SecuenciaAutoguardado",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("client_id", models.CharField(max_length=64)),
+                ("ultimo_seq", models.BigIntegerField(default=0)),
+                ("fecha_actualizacion", models.DateTimeField(auto_now=True)),
+                (
+                    "guia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="secuencias_autoguardado",
+                        to="guia.guiaautocontrol",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="secuencias_autoguardado",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Secuencia de Autoguardado",
+                "verbose_name_plural": "Secuencias de Autoguardado",
+                "unique_together": {("guia", "usuario", "client_id")},
+            },
+        ),
+    ]
@@ -1,21 +1,84 @@
 """Modelo mejorado para Guías de Autocontrol con optimizaciones de rendimiento y API de datos"""
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.cache import cache
-from django.db.models import Index
-from docx import Document
+from django.db.models import BinaryField, Case, F, FloatField, DecimalField, Func, Index, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Length, Round
+from django.db.models.lookups import Exact, GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
 from apps.dashboard.models import Archivo
+from .indice import VERSION_INDICE, construir_indice_preguntas, expandir_indice
+from . import vectores
+from .extraccion import (
+    BACKEND_STREAMING, DocumentoExtraido, backend_docx, cargar_documento, iterar_elementos_docx, iterar_filas,
+    iterar_filas_pdf, iterar_paginas_pdf,
+)
+from .clasificacion import (
+    PLANTILLA_POR_DEFECTO, TIPO_BLOQUE, TIPO_CIERRE, TIPO_COMPONENTE, TIPO_ENCABEZADO,
+    TIPO_PREGUNTA, TIPO_VACIA, limpiar_fila, limpiar_texto, obtener_clasificador,
+)
 import re
+import hashlib
 import logging
-import PyPDF2
 import mimetypes
-import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from collections import OrderedDict
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Versión de la lógica de extracción. Incrementarla invalida el cache de extracción.
+VERSION_PARSER = '1'
+
+# Intentos de un UPDATE condicional de la evaluación antes de dar el conflicto por perdido
+REINTENTOS_VERSION_EVALUACION = 3
+
+# Estado SHA-256 de las subidas de evidencias en curso en este proceso: {token: (bytes, hash)}.
+# Se acota como LRU: una subida abandonada sale al llegar otras y, si vuelve, su hash se
+# recalcula desde el archivo parcial.
+MAXIMO_HASHES_SUBIDAS = 64
+_hashes_subidas = OrderedDict()
+_hashes_subidas_lock = threading.Lock()
+
+
+class ConflictoVersionEvaluacion(Exception):
+    """La evaluación cambió en otra petición durante todos los reintentos del UPDATE condicional."""
+
+
+class FijarByte(Func):
+    """Reemplaza el byte `posicion` (desde 0) de un campo binario por `codigo` dentro del UPDATE."""
+    output_field = BinaryField()
+
+    def __init__(self, expresion, posicion, codigo, **extra):
+        super().__init__(expresion, Value(codigo, output_field=BinaryField()), **extra)
+        self.posicion = posicion
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # OVERLAY es SQL estándar (PostgreSQL, entre otros)
+        return super().as_sql(
+            compiler, connection,
+            template=f'OVERLAY(%(expressions)s FROM {self.posicion + 1} FOR 1)',
+            arg_joiner=' PLACING ',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite no tiene OVERLAY; los códigos son ASCII, así que se puede concatenar
+        expresion, codigo = self.get_source_expressions()
+        sql_expresion, params_expresion = compiler.compile(expresion)
+        sql_codigo, params_codigo = compiler.compile(codigo)
+        sql = (
+            f'CAST(SUBSTR({sql_expresion}, 1, {self.posicion}) || {sql_codigo} || '
+            f'SUBSTR({sql_expresion}, {self.posicion + 2}) AS BLOB)'
+        )
+        return sql, (*params_expresion, *params_codigo, *params_expresion)
+
 class GuiaAutocontrol(models.Model):
     """
     Modelo mejorado para Guías de Autocontrol con:
@@ -23,6 +86,13 @@ class GuiaAutocontrol(models.Model):
     - Mejor API de datos para consultas frecuentes
     - Indexación de búsquedas
     """
+    ESTADO_PROCESAMIENTO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('lista', 'Lista'),
+        ('fallida', 'Fallida'),
+    ]
+
     archivo = models.OneToOneField(
         Archivo,
         on_delete=models.CASCADE,
@@ -37,10 +107,21 @@ class GuiaAutocontrol(models.Model):
     fecha_procesamiento = models.DateTimeField(auto_now=True)
     hash_archivo = models.CharField(max_length=64, blank=True, editable=False)
     version = models.CharField(max_length=20, blank=True)
+
+    # Estado de la extracción en segundo plano
+    estado_procesamiento = models.CharField(max_length=20, choices=ESTADO_PROCESAMIENTO_CHOICES, default='pendiente')
+    error_procesamiento = models.TextField(blank=True)
+    duracion_procesamiento = models.FloatField(null=True, blank=True, help_text='Segundos empleados en la última extracción')
     
     # Campos denormalizados para optimización
     total_preguntas = models.PositiveIntegerField(default=0, editable=False)
     categorias_count = models.PositiveIntegerField(default=0, editable=False)
+    indice_preguntas = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Índice compacto del cuestionario: orden de preguntas, componente y bloque de cada una"
+    )
 
     class Meta:
         verbose_name = 'Guía de Autocontrol'
@@ -50,20 +131,34 @@ class GuiaAutocontrol(models.Model):
             Index(fields=['componente']),
             Index(fields=['activa', 'fecha_procesamiento']),
             Index(fields=['total_preguntas']),
+            Index(fields=['activa', 'estado_procesamiento']),
         ]
 
     def __str__(self):
         return f"Guía: {self.titulo_guia or self.archivo.nombre}"
 
+    # Claves de cache derivadas del contenido de una guía (contenido, posiciones del vector, árbol HTML)
+    SUFIJOS_CACHE = ('contenido', 'posiciones', 'arbol')
+
+    @classmethod
+    def invalidar_cache(cls, *guia_ids):
+        """Borra todas las entradas de cache derivadas del contenido de las guías indicadas."""
+        cache.delete_many([f'guia_{guia_id}_{sufijo}' for guia_id in guia_ids for sufijo in cls.SUFIJOS_CACHE])
+
     def save(self, *args, **kwargs):
         """Sobreescritura de save para calcular campos denormalizados y hash"""
-        if self.archivo and self.archivo.archivo:
+        update_fields = kwargs.get('update_fields')
+        if self.archivo and self.archivo.archivo and (update_fields is None or 'hash_archivo' in update_fields):
             self.hash_archivo = self.calcular_hash_archivo()
         
         # Actualizar campos denormalizados
+        self.__dict__.pop('_indice', None)
         if self.contenido_procesado:
+            self.indice_preguntas = construir_indice_preguntas(self.contenido_procesado)
             self.total_preguntas = self._calcular_total_preguntas()
             self.categorias_count = len(self.contenido_procesado.get('tablas_cuestionario', []))
+        if self.pk:
+            GuiaAutocontrol.invalidar_cache(self.pk)
         # Actualiza el título de la guía si el archivo tiene nombre
         if self.archivo and self.archivo.get_nombre_archivo():
             self.titulo_guia = self.archivo.get_nombre_archivo()
@@ -71,20 +166,12 @@ class GuiaAutocontrol(models.Model):
         super().save(*args, **kwargs)
 
     def calcular_hash_archivo(self):
-        """Calcula hash SHA-256 del archivo para detectar cambios"""
-        hash_obj = hashlib.sha256()
-        with self.archivo.archivo.open('rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                hash_obj.update(chunk)
-        return hash_obj.hexdigest()
+        """Hash SHA-256 del archivo para detectar cambios; solo se relee si cambió su huella"""
+        return self.archivo.obtener_hash()
 
     def _calcular_total_preguntas(self):
         """Calcula el total de preguntas para denormalización"""
-        count = 0
-        for categoria in self.contenido_procesado.get('tablas_cuestionario', []):
-            for bloque in categoria.get('bloques', []):
-                count += len(bloque.get('preguntas', []))
-        return count
+        return len(self.get_indice()['preguntas'])
 
     # API de Datos Mejorada #
     def get_contenido_cache(self):
@@ -96,6 +183,43 @@ class GuiaAutocontrol(models.Model):
             cache.set(cache_key, contenido, timeout=3600)  # 1 hora de cache
         return contenido
 
+    def get_indice(self):
+        """
+        Índice de consulta del cuestionario (ver indice.expandir_indice): preguntas en orden,
+        componente_de, bloque_de, por_componente y total_por_componente. Se expande una sola
+        vez por instancia desde indice_preguntas; solo recorre el contenido si la guía aún
+        no tiene un índice persistido de la versión actual.
+        """
+        indice = self.__dict__.get('_indice')
+        if indice is None:
+            indice = self.__dict__['_indice'] = expandir_indice(self.get_indice_persistido())
+        return indice
+
+    def get_indice_persistido(self):
+        """Índice en su forma persistible; se reconstruye si falta o es de otra versión."""
+        persistido = self.indice_preguntas
+        if not persistido or persistido.get('version') != VERSION_INDICE:
+            persistido = construir_indice_preguntas(self.contenido_procesado)
+        return persistido
+
+    @classmethod
+    def posiciones_preguntas(cls, guia_id):
+        """
+        {numero_pregunta: posición} de una guía, con cache. Lo usa la señal de RespuestaGuia
+        para actualizar el vector de respuestas sin cargar la guía en cada guardado.
+        """
+        cache_key = f'guia_{guia_id}_posiciones'
+        posiciones = cache.get(cache_key)
+        if posiciones is None:
+            guia = cls.objects.only('pk', 'indice_preguntas', 'contenido_procesado').get(pk=guia_id)
+            posiciones = guia.get_indice()['posicion_de']
+            cache.set(cache_key, posiciones, timeout=3600)
+        return posiciones
+
+    def get_indice_preguntas(self):
+        """Lista de (componente, [números de pregunta]) en el orden del documento."""
+        return self.get_indice()['por_componente']
+
     def get_preguntas_por_componente(self, use_cache=True):
         """Devuelve preguntas agrupadas por componente"""
         if use_cache:
@@ -139,28 +263,29 @@ class GuiaAutocontrol(models.Model):
         """Genera resumen de evaluación para un usuario específico"""
         from .models import RespuestaGuia  # Importación local para evitar circular
         
-        respuestas = RespuestaGuia.objects.filter(
+        numeros_respondidos = list(RespuestaGuia.objects.filter(
             guia=self,
             usuario_id=usuario_id
-        ).select_related('guia')
+        ).values_list('numero_pregunta', flat=True))
         
         total_preguntas = self.total_preguntas
-        respondidas = respuestas.count()
+        respondidas = len(numeros_respondidos)
         
-        # Agrupación por componente
+        # Agrupación por componente con el índice precalculado (una sola consulta)
+        indice = self.get_indice()
+        respondidas_por_componente = {}
+        for numero in numeros_respondidos:
+            componente = indice['componente_de'].get(numero)
+            if componente is not None:
+                respondidas_por_componente[componente] = respondidas_por_componente.get(componente, 0) + 1
+
         por_componente = {}
-        preguntas_por_componente = self.get_preguntas_por_componente()
-        
-        for componente, preguntas in preguntas_por_componente.items():
-            ids_preguntas = [p['numero_pregunta'] for p in preguntas]
-            respuestas_componente = respuestas.filter(
-                numero_pregunta__in=ids_preguntas
-            ).count()
-            
+        for componente, total in indice['total_por_componente'].items():
+            respuestas_componente = respondidas_por_componente.get(componente, 0)
             por_componente[componente] = {
-                'total': len(ids_preguntas),
+                'total': total,
                 'respondidas': respuestas_componente,
-                'porcentaje': round((respuestas_componente / len(ids_preguntas)) * 100, 2) if ids_preguntas else 0
+                'porcentaje': round((respuestas_componente / total) * 100, 2) if total else 0
             }
         
         return {
@@ -171,20 +296,28 @@ class GuiaAutocontrol(models.Model):
         }
 
 
+    def estadisticas_por_pregunta(self):
+        """
+        Informe de todos los usuarios: conteos si/no/na/sin responder de cada pregunta.
+        Carga los vectores de respuestas de la guía en una matriz y la agrega en una sola pasada.
+        """
+        preguntas = self.get_indice()['preguntas']
+        evaluaciones = list(EvaluacionGuia.objects.filter(guia=self).select_related(None).only(
+            'pk', 'guia_id', 'usuario_id', 'vector_respuestas'
+        ))
+        for evaluacion in evaluaciones:
+            evaluacion.guia = self
+        matriz = vectores.matriz_respuestas(
+            [evaluacion.obtener_vector_respuestas() for evaluacion in evaluaciones], len(preguntas)
+        )
+        return vectores.estadisticas_por_pregunta(matriz, preguntas)
+
     def get_absolute_url(self):
         return reverse('guia:detalle', kwargs={'pk': self.pk})
 
     def _limpiar_texto(self, texto):
         """Limpia el texto eliminando caracteres no deseados y normalizando espacios."""
-        if not isinstance(texto, str):
-            return str(texto)
-        texto = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', texto)
-        texto = re.sub(r'\s+', ' ', texto)
-        try:
-            texto = texto.encode('utf-8').decode('utf-8')
-        except UnicodeEncodeError:
-            texto = texto.encode('ascii', 'ignore').decode('ascii')
-        return texto.strip()
+        return limpiar_texto(texto)
 
     def _procesar_estructura_para_json(self, estructura):
         """Procesa una estructura (lista o diccionario) para asegurar compatibilidad JSON."""
@@ -199,47 +332,69 @@ class GuiaAutocontrol(models.Model):
         """Helper para crear un diccionario seguro para contenido_procesado."""
         return {'error': error} if error else {}
     
-    def _es_fila_vacia(self, celdas):
-        """Verifica si una fila está vacía."""
-        return not any(c for c in celdas if c)
-
-    def _es_fila_encabezado_cuestionario(self, celdas):
-        """Verifica si la fila es el encabezado de un cuestionario."""
-        return any("ASPECTOS A VERIFICAR" in c.upper() for c in celdas if c)
-
-    def _es_fila_de_componente(self, celdas):
-        """Verifica si la fila define un nuevo componente."""
-        return len(celdas) >= 3 and len(set(c for c in celdas if c)) == 1 and celdas[0]
-
-    def _es_fila_de_bloque(self, celdas):
-        """Verifica si la fila define un nuevo bloque de preguntas."""
-        return any(re.search(r":\s*$", c) for c in celdas if c)
-
-    def _obtener_texto_encabezado(self, celdas):
-        """Obtiene el texto del encabezado de la fila."""
-        for celda in celdas:
-            if re.search(r":\s*$", celda):
-                return self._limpiar_texto(celda)
-        return None
-
-    def _obtener_pregunta(self, celdas, contador_preguntas):
-        """Extrae la pregunta de la fila y actualiza el contador."""
-        if len(celdas) > 1:
-            texto_celda = celdas[1].strip()
-            if re.match(r"^\d+\.?\s*.+", texto_celda):
-                texto_pregunta = re.sub(r"^\d+\.?\s*", "", texto_celda).strip()
-                contador_preguntas += 1
-                return {
-                    "numero_pregunta": contador_preguntas,
-                    "texto": texto_pregunta
-                }, contador_preguntas
-        return None, contador_preguntas
-    
     def _parsear_tabla_docx(self, path):
         """
         Parsea tablas de un documento .docx para extraer componentes, bloques y preguntas.
         """
-        doc = Document(path)
+        return self._parsear_filas_cuestionario(iterar_filas(path))
+
+    def _parsear_pdf(self, path, plantilla=PLANTILLA_POR_DEFECTO):
+        """
+        Recorre las páginas de un PDF una sola vez y devuelve (texto completo, tablas_cuestionario).
+        Las páginas se extraen bajo demanda y la lectura termina al llegar al cierre del cuestionario.
+        """
+        textos = []
+
+        def paginas():
+            for texto in iterar_paginas_pdf(path):
+                if texto:
+                    textos.append(texto)
+                yield texto
+
+        filas = iterar_filas_pdf(paginas(), obtener_clasificador(plantilla))
+        tablas_cuestionario = self._parsear_filas_cuestionario(filas, plantilla)
+        filas.close()
+        return "\n".join(textos), tablas_cuestionario
+
+    def _parsear_docx(self, path, plantilla=PLANTILLA_POR_DEFECTO):
+        """
+        Recorre un .docx una sola vez y devuelve (texto completo, tablas_cuestionario).
+        Con el backend streaming la lectura termina al llegar al cierre del cuestionario;
+        python-docx construye siempre el documento completo.
+        """
+        if backend_docx() != BACKEND_STREAMING:
+            documento = cargar_documento(path)
+            return documento.texto_completo(), self._parsear_filas_cuestionario(documento.filas(), plantilla)
+
+        documento = DocumentoExtraido()
+
+        def filas():
+            for tipo, contenido in iterar_elementos_docx(path):
+                if tipo == 'parrafo':
+                    documento.parrafos.append(contenido)
+                elif tipo == 'tabla':
+                    documento.tablas.append([])
+                else:
+                    documento.tablas[-1].append(contenido)
+                    yield contenido
+
+        iterador = filas()
+        tablas_cuestionario = self._parsear_filas_cuestionario(iterador, plantilla)
+        iterador.close()
+        return documento.texto_completo(), tablas_cuestionario
+
+    def _parsear_tabla_pdf(self, path):
+        """
+        Parsea el cuestionario de un documento .pdf para extraer componentes, bloques y preguntas.
+        """
+        return self._parsear_pdf(path)[1]
+
+    def _parsear_filas_cuestionario(self, filas, plantilla=PLANTILLA_POR_DEFECTO):
+        """
+        Recorre filas de tablas (listas de textos de celda) para extraer componentes, bloques y preguntas.
+        Cada fila se limpia una vez y se clasifica con las reglas de la plantilla indicada.
+        """
+        clasificador = obtener_clasificador(plantilla)
         tablas_cuestionario = []
         componente_actual = None
         dentro_tabla_cuestionario = False
@@ -247,65 +402,87 @@ class GuiaAutocontrol(models.Model):
         bloque = None
         contador_preguntas = 0
 
-        for tabla in doc.tables:
-            for fila in tabla.rows:
-                celdas = [self._limpiar_texto(cell.text) if cell.text else "" for cell in fila.cells]
+        for fila in filas:
+            celdas = limpiar_fila(fila)
+            indice, tipo, dato = clasificador.clasificar(celdas)
 
-                if self._es_fila_vacia(celdas):
-                    continue
-                
-                if self._es_fila_encabezado_cuestionario(celdas):
-                    dentro_tabla_cuestionario = True
-                    continue
-                
-                if not dentro_tabla_cuestionario:
-                    continue
+            if tipo == TIPO_VACIA:
+                continue
+
+            if tipo == TIPO_ENCABEZADO:
+                dentro_tabla_cuestionario = True
+                continue
 
-                if celdas and "Elaborado y aprobado" in celdas[0]:
-                    break
+            if not dentro_tabla_cuestionario:
+                continue
 
-                if self._es_fila_de_componente(celdas) and self._limpiar_texto(celdas[0]) not in componentes_procesados:
-                    componente_texto = self._limpiar_texto(celdas[0])
-                    componente_actual = {"componente_a_evaluar": componente_texto, "bloques": []}
+            if tipo == TIPO_CIERRE:
+                break
+
+            if tipo == TIPO_COMPONENTE:
+                if dato not in componentes_procesados:
+                    componente_actual = {"componente_a_evaluar": dato, "bloques": []}
                     tablas_cuestionario.append(componente_actual)
-                    componentes_procesados.add(componente_texto)
+                    componentes_procesados.add(dato)
                     bloque = None
                     continue
-                
-                if componente_actual and self._es_fila_de_bloque(celdas):
-                    encabezado_texto = self._obtener_texto_encabezado(celdas)
-                    if encabezado_texto:
-                        bloque = {"encabezado": encabezado_texto, "preguntas": []}
-                        componente_actual["bloques"].append(bloque)
-                    continue
-                
-                if componente_actual and bloque:
-                    pregunta, contador_preguntas = self._obtener_pregunta(celdas, contador_preguntas)
-                    if pregunta:
-                        bloque["preguntas"].append(pregunta)
-                        
+                # Componente repetido: la fila se evalúa con las reglas siguientes
+                indice, tipo, dato = clasificador.clasificar(celdas, desde=indice + 1)
+
+            if tipo == TIPO_BLOQUE:
+                if componente_actual:
+                    bloque = {"encabezado": dato, "preguntas": []}
+                    componente_actual["bloques"].append(bloque)
+                continue
+
+            if tipo == TIPO_PREGUNTA and componente_actual and bloque:
+                contador_preguntas += 1
+                bloque["preguntas"].append({
+                    "numero_pregunta": contador_preguntas,
+                    "texto": dato
+                })
+
         return tablas_cuestionario
 
     # Métodos auxiliares para la lógica de extracción
+    def _es_pdf(self, file_path, mime):
+        """Indica si el archivo es un PDF según su tipo MIME o extensión."""
+        return mime == 'application/pdf' or file_path.lower().endswith('.pdf')
+
+    def _es_docx(self, file_path, mime):
+        """Indica si el archivo es un DOCX según su tipo MIME o extensión."""
+        return mime == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or file_path.lower().endswith('.docx')
+
     def _extraer_texto_de_archivo(self, file_path, mime):
         """Extrae el texto completo de un archivo PDF o DOCX."""
         full_text = ""
-        if mime == 'application/pdf' or file_path.lower().endswith('.pdf'):
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                full_text = "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
-        elif mime == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or file_path.lower().endswith('.docx'):
-            doc = Document(file_path)
-            full_text = "\n".join(para.text for para in doc.paragraphs)
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-                    if row_text:
-                        full_text += row_text + "\n"
+        if self._es_pdf(file_path, mime):
+            full_text = "\n".join(texto for texto in iterar_paginas_pdf(file_path) if texto)
+        elif self._es_docx(file_path, mime):
+            full_text = cargar_documento(file_path).texto_completo()
         else:
             raise ValueError("Tipo de archivo no soportado para extracción automática.")
         return full_text
 
+    def _extraer_datos_archivo(self, file_path):
+        """
+        Etapa única de extracción: lee el archivo una vez y devuelve un diccionario
+        con componente, propósito y tablas_cuestionario.
+        """
+        mime, _ = mimetypes.guess_type(file_path)
+        if self._es_docx(file_path, mime):
+            full_text, tablas_cuestionario = self._parsear_docx(file_path)
+        elif self._es_pdf(file_path, mime):
+            full_text, tablas_cuestionario = self._parsear_pdf(file_path)
+        else:
+            raise ValueError("Tipo de archivo no soportado para extracción automática.")
+
+        return {
+            "componente": self._extraer_componente(full_text),
+            "proposito": self._extraer_y_limpiar_proposito(full_text),
+            "tablas_cuestionario": tablas_cuestionario if tablas_cuestionario else []
+        }
+
     def _extraer_componente(self, full_text):
         """Extrae el componente del texto completo."""
         comp_match = re.search(r'COMPONENTE\s+«?([A-ZÁÉÍÓÚÜÑ\s]+)»?', full_text, re.IGNORECASE)
@@ -340,41 +517,94 @@ class GuiaAutocontrol(models.Model):
             return " ".join(parrafos)
         return ""
 
+    def _restaurar_desde_cache(self, hash_actual):
+        """Restaura componente, propósito y cuestionario desde el cache de extracción."""
+        entrada = CacheExtraccion.objects.filter(
+            hash_archivo=hash_actual,
+            version_parser=VERSION_PARSER
+        ).first()
+        if not entrada:
+            return False
+        self.componente = entrada.componente
+        self.proposito = entrada.proposito
+        self.contenido_procesado = entrada.contenido_procesado
+        self.estado_procesamiento = 'lista'
+        self.error_procesamiento = ''
+        self.save()
+        return True
+
+    def reutilizar_contenido_existente(self):
+        """
+        Si un archivo con el mismo contenido ya fue procesado, copia su resultado
+        sin volver a parsear ni encolar una extracción. Retorna True si se reutilizó.
+        """
+        return bool(self.hash_archivo) and self._restaurar_desde_cache(self.hash_archivo)
+
+    def _guardar_en_cache(self):
+        """Guarda el resultado de la extracción actual en el cache de extracción."""
+        CacheExtraccion.objects.update_or_create(
+            hash_archivo=self.hash_archivo,
+            version_parser=VERSION_PARSER,
+            defaults={
+                'componente': self.componente,
+                'proposito': self.proposito,
+                'contenido_procesado': self.contenido_procesado,
+            }
+        )
+
     # Método principal refactorizado
-    def extraer_contenido_archivo(self):
+    def extraer_contenido_archivo(self, usar_cache=True):
         """
         Extrae y procesa el contenido del archivo asociado (PDF/DOCX).
         Limpia y estructura componente, propósito y cuestionario.
+        Si el archivo ya fue procesado con la versión actual del parser, restaura
+        el resultado desde el cache de extracción. Retorna True si se usó el cache.
         """
         if not self.archivo or not self.archivo.archivo:
             raise ValueError("No hay un archivo asociado a esta Guía de Autocontrol.")
 
         file_path = self.archivo.archivo.path
-        mime, _ = mimetypes.guess_type(file_path)
-        
-        try:
-            full_text = self._extraer_texto_de_archivo(file_path, mime)
-            tablas_cuestionario = []
-
-            if mime == 'application/pdf' or file_path.lower().endswith('.pdf'):
-                tablas_cuestionario = self._parsear_tabla_pdf(file_path)
-            elif mime == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or file_path.lower().endswith('.docx'):
-                tablas_cuestionario = self._parsear_tabla_docx(file_path)
 
-            self.componente = self._extraer_componente(full_text)
-            self.proposito = self._extraer_y_limpiar_proposito(full_text)
+        try:
+            if usar_cache and self._restaurar_desde_cache(self.calcular_hash_archivo()):
+                logger.info(f"Contenido de {self.archivo.nombre} restaurado desde el cache de extracción")
+                return True
 
-            self.contenido_procesado = {
-                "componente": self.componente,
-                "proposito": self.proposito,
-                "tablas_cuestionario": tablas_cuestionario if tablas_cuestionario else []
-            }
+            datos = self._extraer_datos_archivo(file_path)
+            self.componente = datos["componente"]
+            self.proposito = datos["proposito"]
+            self.contenido_procesado = datos
+            self.estado_procesamiento = 'lista'
+            self.error_procesamiento = ''
             self.save()
+            self._guardar_en_cache()
+            return False
 
         except Exception as e:
             logger.error(f"Error al extraer contenido del archivo {self.archivo.nombre}: {e}")
             raise
-        
+
+    def procesar_extraccion(self, usar_cache=True):
+        """
+        Ejecuta la extracción registrando estado, error y duración del procesamiento.
+        No propaga la excepción: el error queda guardado en la guía. Retorna True si tuvo éxito.
+        """
+        self.estado_procesamiento = 'procesando'
+        GuiaAutocontrol.objects.filter(pk=self.pk).update(estado_procesamiento='procesando', error_procesamiento='')
+        inicio = time.perf_counter()
+        try:
+            self.extraer_contenido_archivo(usar_cache=usar_cache)
+        except Exception as e:
+            self.estado_procesamiento = 'fallida'
+            self.error_procesamiento = str(e)
+        self.duracion_procesamiento = round(time.perf_counter() - inicio, 3)
+        GuiaAutocontrol.objects.filter(pk=self.pk).update(
+            estado_procesamiento=self.estado_procesamiento,
+            error_procesamiento=self.error_procesamiento,
+            duracion_procesamiento=self.duracion_procesamiento
+        )
+        return self.estado_procesamiento == 'lista'
+
 class RespuestaGuia(models.Model):
     """
     Modelo mejorado de Respuesta con optimizaciones
@@ -414,6 +644,14 @@ class RespuestaGuia(models.Model):
     def __str__(self):
         return f"Resp. a P{self.numero_pregunta} ({self.guia}) por {self.usuario}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda el valor de respuesta leído de la base de datos para calcular el cambio al guardar."""
+        instancia = super().from_db(db, field_names, values)
+        if 'respuesta' in field_names:
+            instancia._respuesta_anterior = instancia.respuesta
+        return instancia
+
 
 class EvaluacionGuia(models.Model):
     """
@@ -425,6 +663,13 @@ class EvaluacionGuia(models.Model):
         ('completada', 'Completada'),
         ('revisada', 'Revisada'),
     ]
+
+    # Campos que escribe actualizar_estadisticas
+    CAMPOS_ESTADISTICAS = [
+        'total_respuestas', 'respuestas_si', 'respuestas_no', 'respuestas_na',
+        'porcentaje_cumplimiento', 'estado', 'fecha_completado', 'respuestas_json_pendiente',
+        'vector_respuestas',
+    ]
     
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='evaluaciones_guias')
     guia = models.ForeignKey(GuiaAutocontrol, on_delete=models.CASCADE, related_name='evaluaciones')
@@ -439,12 +684,24 @@ class EvaluacionGuia(models.Model):
     )
     comentarios = models.TextField(blank=True)
     respuestas_json = models.JSONField(default=dict, blank=True, help_text="Tabla de respuestas agrupadas por componente y pregunta")
+    respuestas_json_pendiente = models.BooleanField(
+        default=True,
+        help_text="Indica que respuestas_json está desactualizado y debe reconstruirse al leerse"
+    )
     
     # Campos denormalizados para optimización
     total_respuestas = models.PositiveIntegerField(default=0)
     respuestas_si = models.PositiveIntegerField(default=0)
     respuestas_no = models.PositiveIntegerField(default=0)
     respuestas_na = models.PositiveIntegerField(default=0)
+    vector_respuestas = models.BinaryField(
+        default=b'',
+        blank=True,
+        help_text="Un código por pregunta (ver vectores.py) en el orden del índice de la guía"
+    )
+
+    # Control de concurrencia optimista: cada escritura de los contadores la incrementa
+    version = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ('guia', 'usuario')
@@ -459,20 +716,113 @@ class EvaluacionGuia(models.Model):
     def __str__(self):
         return f"Evaluación de {self.guia.titulo_guia} por {self.usuario.username}"
 
-    def actualizar_estadisticas(self):
+    def save(self, *args, **kwargs):
+        """Al crear la evaluación, parte de los contadores de las respuestas que ya existan"""
+        if self._state.adding and not self.total_respuestas:
+            self._asignar_contadores()
+        super().save(*args, **kwargs)
+
+    def _asignar_contadores(self):
         """
-        Actualiza campos denormalizados basado en respuestas
+        Lee las respuestas del usuario para la guía con una única consulta y reconstruye
+        a partir de ellas el vector empaquetado y los contadores.
+        """
+        respuestas = list(RespuestaGuia.objects.filter(guia_id=self.guia_id, usuario_id=self.usuario_id).values_list(
+            'numero_pregunta', 'respuesta'
+        ))
+        indice = self.guia.get_indice()
+        self.vector_respuestas = vectores.empaquetar(respuestas, indice['posicion_de'], len(indice['preguntas']))
+        self.total_respuestas = len(respuestas)
+        self.respuestas_si = sum(1 for _, respuesta in respuestas if respuesta == 'si')
+        self.respuestas_no = sum(1 for _, respuesta in respuestas if respuesta == 'no')
+        self.respuestas_na = sum(1 for _, respuesta in respuestas if respuesta == 'na')
+
+    @classmethod
+    def aplicar_cambio_respuesta(cls, guia_id, usuario_id, numero_pregunta, anterior, nueva, delta_total):
+        """
+        Aplica a la evaluación el cambio de una respuesta (valor anterior -> valor nuevo)
+        con un único UPDATE atómico: los contadores se ajustan con F(), el byte de la
+        pregunta se reescribe en el vector, y el porcentaje, el estado y la fecha de
+        completado se derivan de los contadores en la misma sentencia.
+        """
+        deltas = {
+            campo: (nueva == valor) - (anterior == valor)
+            for campo, valor in (('respuestas_si', 'si'), ('respuestas_no', 'no'), ('respuestas_na', 'na'))
+        }
+        evaluaciones = cls.objects.filter(guia_id=guia_id, usuario_id=usuario_id)
+        if not delta_total and not any(deltas.values()):
+            # Solo cambió la fundamentación: los contadores no se tocan, la versión sí
+            return evaluaciones.update(version=F('version') + 1, respuestas_json_pendiente=True)
+
+        validas = F('respuestas_si') + F('respuestas_no') + F('respuestas_na') + Value(sum(deltas.values()))
+        total_preguntas = Subquery(
+            GuiaAutocontrol.objects.filter(pk=OuterRef('guia_id')).values('total_preguntas')[:1]
+        )
+        porcentaje = Case(
+            When(
+                GreaterThan(total_preguntas, 0),
+                then=Round(Cast(validas, FloatField()) * Value(100.0) / Cast(total_preguntas, FloatField()), 2),
+            ),
+            default=F('porcentaje_cumplimiento'),
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        )
+        completada = GreaterThanOrEqual(porcentaje, 100)
+        campos_vector = {}
+        posicion = GuiaAutocontrol.posiciones_preguntas(guia_id).get(numero_pregunta)
+        if posicion is not None:
+            # Un vector de otra longitud está desactualizado: se reconstruye al leerlo
+            campos_vector['vector_respuestas'] = Case(
+                When(
+                    Exact(Length('vector_respuestas'), total_preguntas),
+                    then=FijarByte(F('vector_respuestas'), posicion, vectores.codigo_respuesta(nueva)),
+                ),
+                default=F('vector_respuestas'),
+                output_field=BinaryField(),
+            )
+        return evaluaciones.update(
+            **campos_vector,
+            version=F('version') + 1,
+            respuestas_json_pendiente=True,
+            total_respuestas=F('total_respuestas') + Value(delta_total),
+            **{campo: F(campo) + Value(delta) for campo, delta in deltas.items()},
+            porcentaje_cumplimiento=porcentaje,
+            # Una evaluación revisada conserva su estado y su fecha (igual que en sincronizar_estado)
+            estado=Case(
+                When(estado='revisada', then=F('estado')),
+                When(completada, then=Value('completada')),
+                default=Value('en_progreso'),
+            ),
+            fecha_completado=Case(
+                When(estado='revisada', then=F('fecha_completado')),
+                When(completada, then=Coalesce(F('fecha_completado'), Value(timezone.now()))),
+                default=None,
+            ),
+        )
+
+    def guardar_condicional(self, campos):
+        """
+        Guarda los campos indicados con un UPDATE ... WHERE version = n e incrementa la versión.
+        Retorna False, sin escribir nada, si otra petición modificó la evaluación desde que se leyó.
+        """
+        valores = {campo: getattr(self, campo) for campo in campos}
+        filas = EvaluacionGuia.objects.filter(pk=self.pk, version=self.version).update(
+            version=F('version') + 1, **valores
+        )
+        if filas:
+            self.version += 1
+        return bool(filas)
+
+    def _calcular_estadisticas(self):
+        """Recalcula en memoria los contadores, el porcentaje y el estado a partir de las respuestas."""
+        self._asignar_contadores()
+        self.respuestas_json_pendiente = True
+        self._derivar_estado()
+
+    def _derivar_estado(self):
+        """
+        Deriva en memoria el porcentaje, el estado y la fecha de completado de los contadores.
+        El estado 'revisada' no se deriva: lo mantienen todas las rutas de escritura.
         """
-        # Obtener todas las respuestas de este usuario para esta guía
-        from .models import RespuestaGuia
-        respuestas = RespuestaGuia.objects.filter(guia=self.guia, usuario=self.usuario)
-        
-        # Calcula y guarda el total de respuestas y el conteo por tipo para este usuario y guía
-        self.total_respuestas = respuestas.count()
-        self.respuestas_si = respuestas.filter(respuesta='si').count()
-        self.respuestas_no = respuestas.filter(respuesta='no').count()
-        self.respuestas_na = respuestas.filter(respuesta='na').count()
-        
         # Solo contar respuestas válidas (si/no/na) para el porcentaje
         respuestas_validas = self.respuestas_si + self.respuestas_no + self.respuestas_na
         total_preguntas = self.guia.total_preguntas
@@ -482,49 +832,116 @@ class EvaluacionGuia(models.Model):
                 (respuestas_validas  / total_preguntas) * 100, 
                 2
             )
-        
+
+        # Una evaluación revisada conserva su estado y su fecha: solo cambian los contadores
+        if self.estado == 'revisada':
+            return
+
         if self.porcentaje_cumplimiento >= 100:
             self.estado = 'completada'
             # Solo asigna la fecha si aún no está puesta
             if not self.fecha_completado:
-                from django.utils import timezone
                 self.fecha_completado = timezone.now()
         else:
             self.estado = 'en_progreso'
             # Si se vuelve a menos de 100%, borra la fecha de completado
             self.fecha_completado = None
 
-        self.save()
+    def sincronizar_estado(self):
+        """
+        Deriva porcentaje y estado de los contadores guardados y solo escribe si cambiaron
+        (p. ej. tras reprocesar la guía con otro número de preguntas). Las evaluaciones
+        revisadas no se tocan. Retorna True si hubo escritura.
+        """
+        if self.estado == 'revisada':
+            return False
+        antes = (round(float(self.porcentaje_cumplimiento), 2), self.estado, self.fecha_completado)
+        self._derivar_estado()
+        if (round(float(self.porcentaje_cumplimiento), 2), self.estado, self.fecha_completado) == antes:
+            return False
+        if not self.guardar_condicional(['porcentaje_cumplimiento', 'estado', 'fecha_completado']):
+            # Otra petición escribió antes: su estado es más reciente
+            self.refresh_from_db()
+            return False
+        return True
+
+    def actualizar_estadisticas(self):
+        """
+        Recalcula por completo los campos denormalizados a partir de las respuestas.
+        Se usa tras los guardados por lotes (que no disparan señales) y para reparar
+        evaluaciones (comando recalcular_evaluaciones). La escritura es condicional a la
+        versión leída: si otra petición la cambió, se vuelve a leer y se recalcula.
+        """
+        if self.pk is None:
+            self._calcular_estadisticas()
+            self.save()
+            return
+        for _ in range(REINTENTOS_VERSION_EVALUACION):
+            self._calcular_estadisticas()
+            if self.guardar_condicional(self.CAMPOS_ESTADISTICAS):
+                return
+            self.refresh_from_db(fields=['version', 'estado', 'fecha_completado'])
+        raise ConflictoVersionEvaluacion(
+            f'La evaluación {self.pk} cambió en otra petición durante {REINTENTOS_VERSION_EVALUACION} intentos'
+        )
 
     def actualizar_respuestas_json(self):
         """
         Actualiza el campo respuestas_json con la estructura agrupada por componente, número de pregunta, respuesta y fundamentación.
+        Las respuestas se leen con una sola consulta y se cruzan en memoria con el índice de preguntas de la guía.
         """
-        from .models import RespuestaGuia
-        # Obtener todas las respuestas de este usuario para esta guía
-        respuestas = RespuestaGuia.objects.filter(guia=self.guia, usuario=self.usuario)
-        # Obtener la estructura de componentes y preguntas
-        contenido = self.guia.get_contenido_cache()
+        # Se limpia la marca antes de leer: una respuesta guardada mientras tanto la vuelve a activar
+        EvaluacionGuia.objects.filter(pk=self.pk).update(respuestas_json_pendiente=False)
+        respuestas = {
+            r['numero_pregunta']: r
+            for r in RespuestaGuia.objects.filter(guia_id=self.guia_id, usuario_id=self.usuario_id).values(
+                'numero_pregunta', 'respuesta', 'fundamentacion'
+            )
+        }
         tabla = []
-        for componente in contenido.get('tablas_cuestionario', []):
-            comp_nombre = componente.get('componente_a_evaluar', '')
+        for comp_nombre, numeros in self.guia.get_indice_preguntas():
             comp_respuestas = []
-            for bloque in componente.get('bloques', []):
-                for pregunta in bloque.get('preguntas', []):
-                    num = pregunta.get('numero_pregunta')
-                    r = respuestas.filter(numero_pregunta=num).first()
-                    comp_respuestas.append({
-                        'numero_pregunta': num,
-                        'respuesta': r.respuesta if r else '',
-                        'fundamentacion': r.fundamentacion if r else ''
-                    })
+            for num in numeros:
+                r = respuestas.get(num)
+                comp_respuestas.append({
+                    'numero_pregunta': num,
+                    'respuesta': r['respuesta'] if r else '',
+                    'fundamentacion': r['fundamentacion'] if r else ''
+                })
             tabla.append({
                 'componente_a_evaluar': comp_nombre,
                 'respuestas_guias': comp_respuestas
             })
         self.respuestas_json = {'tabla_respuestas': tabla}
+        self.respuestas_json_pendiente = False
         self.save(update_fields=['respuestas_json'])
 
+    def obtener_vector_respuestas(self):
+        """
+        Devuelve el vector de respuestas. Si su longitud no coincide con el cuestionario
+        (evaluación anterior al vector o guía reprocesada) se reconstruye y se guarda.
+        """
+        vector = bytes(self.vector_respuestas)
+        total_preguntas = len(self.guia.get_indice()['preguntas'])
+        if len(vector) != total_preguntas:
+            respuestas = RespuestaGuia.objects.filter(
+                guia_id=self.guia_id, usuario_id=self.usuario_id
+            ).values_list('numero_pregunta', 'respuesta')
+            vector = vectores.empaquetar(respuestas, self.guia.get_indice()['posicion_de'], total_preguntas)
+            EvaluacionGuia.objects.filter(pk=self.pk).update(vector_respuestas=vector)
+            self.vector_respuestas = vector
+        return vector
+
+    def contar_respuestas(self):
+        """Conteos si/no/na del usuario leídos del vector de respuestas."""
+        return vectores.contar(self.obtener_vector_respuestas())
+
+    def obtener_respuestas_json(self):
+        """Devuelve respuestas_json; solo se reconstruye si hubo respuestas nuevas desde la última lectura."""
+        if self.respuestas_json_pendiente:
+            self.actualizar_respuestas_json()
+        return self.respuestas_json
+
     def generar_informe(self):
         """
         Genera informe detallado de la evaluación
@@ -543,5 +960,335 @@ class EvaluacionGuia(models.Model):
                 'no': self.respuestas_no,
                 'na': self.respuestas_na,
             },
-            'por_componente': self.guia.generar_resumen_evaluacion(self.usuario_id)['por_componente']
+            'por_componente': self.guia.generar_resumen_evaluacion(self.usuario_id)['por_componente'],
+            'tabla_respuestas': self.obtener_respuestas_json().get('tabla_respuestas', []),
         }
+
+
+class CacheExtraccion(models.Model):
+    """
+    Cache persistente de extracción direccionado por contenido.
+    La clave combina el hash SHA-256 del archivo con la versión del parser.
+    """
+    hash_archivo = models.CharField(max_length=64)
+    version_parser = models.CharField(max_length=20)
+    componente = models.CharField(max_length=200, blank=True)
+    proposito = models.TextField(blank=True)
+    contenido_procesado = models.JSONField(default=dict, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('hash_archivo', 'version_parser')
+        verbose_name = 'Cache de Extracción'
+        verbose_name_plural = 'Cache de Extracciones'
+
+    def __str__(self):
+        return f"Extracción {self.hash_archivo[:12]} (parser v{self.version_parser})"
+
+    @classmethod
+    def purgar_obsoletas(cls):
+        """Borra las entradas de versiones anteriores del parser, que ya no se consultan. Devuelve cuántas se borraron."""
+        return cls.objects.exclude(version_parser=VERSION_PARSER).delete()[0]
+
+
+class DiarioRespuesta(models.Model):
+    """
+    Diario de escritura diferida (write-behind) de respuestas. Solo se insertan filas:
+    el worker las aplica por lotes a RespuestaGuia y borra las aplicadas en la misma
+    transacción, de modo que las filas presentes son siempre las pendientes, también
+    después de una caída del proceso.
+    """
+    guia = models.ForeignKey(GuiaAutocontrol, on_delete=models.CASCADE, related_name='diario_respuestas')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='diario_respuestas')
+    numero_pregunta = models.IntegerField()
+    respuesta = models.CharField(max_length=4, choices=RespuestaGuia.RESPUESTA_CHOICES, blank=True, null=True)
+    fundamentacion = models.TextField(blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Entrada del Diario de Respuestas'
+        verbose_name_plural = 'Diario de Respuestas'
+        ordering = ['pk']
+        indexes = [
+            Index(fields=['guia', 'usuario']),
+        ]
+
+    def __str__(self):
+        return f"Diario P{self.numero_pregunta} (guía {self.guia_id}, usuario {self.usuario_id})"
+
+    @classmethod
+    def registrar(cls, guia, usuario, respuestas):
+        """Añade al diario un lote validado {numero_pregunta: (respuesta, fundamentacion)} con un solo INSERT."""
+        cls.objects.bulk_create([
+            cls(
+                guia=guia,
+                usuario=usuario,
+                numero_pregunta=numero_pregunta,
+                respuesta=respuesta,
+                fundamentacion=fundamentacion
+            )
+            for numero_pregunta, (respuesta, fundamentacion) in respuestas.items()
+        ])
+
+    @classmethod
+    def pendientes_de(cls, guia_id, usuario_id):
+        """Entradas aún no aplicadas de un usuario en una guía: {numero_pregunta: (respuesta, fundamentacion)}."""
+        return {
+            numero_pregunta: (respuesta, fundamentacion)
+            for numero_pregunta, respuesta, fundamentacion in cls.objects.filter(
+                guia_id=guia_id, usuario_id=usuario_id
+            ).order_by('pk').values_list('numero_pregunta', 'respuesta', 'fundamentacion')
+        }
+
+    @classmethod
+    def respuestas_efectivas(cls, guia_id, usuario_id):
+        """
+        Respuestas que ve el usuario: las guardadas en RespuestaGuia con las entradas
+        pendientes del diario encima. Retorna {numero_pregunta: (respuesta, fundamentacion)}.
+        """
+        respuestas = {
+            numero_pregunta: (respuesta, fundamentacion)
+            for numero_pregunta, respuesta, fundamentacion in RespuestaGuia.objects.filter(
+                guia_id=guia_id, usuario_id=usuario_id
+            ).values_list('numero_pregunta', 'respuesta', 'fundamentacion')
+        }
+        respuestas.update(cls.pendientes_de(guia_id, usuario_id))
+        return respuestas
+
+    @classmethod
+    def aplicar_lote(cls, limite=500):
+        """
+        Aplica las entradas más antiguas del diario (hasta `limite`) en una transacción:
+        un único upsert en RespuestaGuia (si una pregunta se repite prevalece la última
+        entrada), un recálculo por evaluación afectada y el borrado de las entradas.
+        Retorna el número de entradas aplicadas.
+        """
+        with transaction.atomic():
+            entradas = list(cls.objects.order_by('pk').values(
+                'pk', 'guia_id', 'usuario_id', 'numero_pregunta', 'respuesta', 'fundamentacion'
+            )[:limite])
+            if not entradas:
+                return 0
+            ultimas = {(e['guia_id'], e['usuario_id'], e['numero_pregunta']): e for e in entradas}
+            RespuestaGuia.objects.bulk_create(
+                [
+                    RespuestaGuia(
+                        guia_id=guia_id,
+                        usuario_id=usuario_id,
+                        numero_pregunta=numero_pregunta,
+                        respuesta=entrada['respuesta'],
+                        fundamentacion=entrada['fundamentacion']
+                    )
+                    for (guia_id, usuario_id, numero_pregunta), entrada in ultimas.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['guia', 'usuario', 'numero_pregunta'],
+                update_fields=['respuesta', 'fundamentacion', 'fecha_respuesta', 'fecha_modificacion']
+            )
+            afectadas = {(guia_id, usuario_id) for guia_id, usuario_id, _ in ultimas}
+            guias = GuiaAutocontrol.objects.only('pk', 'total_preguntas', 'indice_preguntas').in_bulk({guia_id for guia_id, _ in afectadas})
+            for guia_id, usuario_id in afectadas:
+                evaluacion, _ = EvaluacionGuia.objects.get_or_create(
+                    guia_id=guia_id,
+                    usuario_id=usuario_id,
+                    defaults={'estado': 'en_progreso'}
+                )
+                evaluacion.guia = guias[guia_id]
+                evaluacion.actualizar_estadisticas()
+            cls.objects.filter(pk__in=[e['pk'] for e in entradas]).delete()
+        return len(entradas)
+
+
+class SecuenciaAutoguardado(models.Model):
+    """
+    Último client_seq aplicado por cada pestaña (client_id) de un usuario en una guía.
+    El lote se reclama con un UPDATE condicional (ultimo_seq < client_seq) dentro de la
+    misma transacción que lo aplica: la fila queda bloqueada hasta confirmar, así que dos
+    lotes concurrentes de la misma pestaña se aplican en orden y uno atrasado se descarta.
+    """
+    RETENCION = timedelta(hours=12)
+
+    guia = models.ForeignKey(GuiaAutocontrol, on_delete=models.CASCADE, related_name='secuencias_autoguardado')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='secuencias_autoguardado')
+    client_id = models.CharField(max_length=64)
+    ultimo_seq = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('guia', 'usuario', 'client_id')
+        verbose_name = 'Secuencia de Autoguardado'
+        verbose_name_plural = 'Secuencias de Autoguardado'
+
+    def __str__(self):
+        return f"Pestaña {self.client_id} (guía {self.guia_id}, usuario {self.usuario_id}): {self.ultimo_seq}"
+
+    @classmethod
+    def reclamar(cls, guia, usuario, client_id, client_seq):
+        """
+        Registra client_seq como aplicado si es mayor que el último. Debe llamarse dentro de
+        la transacción que aplica el lote. Retorna (True, client_seq) si el lote debe
+        aplicarse o (False, último aplicado) si es un reintento o llegó atrasado.
+        """
+        secuencias = cls.objects.filter(guia=guia, usuario=usuario, client_id=client_id)
+        if secuencias.filter(ultimo_seq__lt=client_seq).update(ultimo_seq=client_seq, fecha_actualizacion=timezone.now()):
+            return True, client_seq
+        if not secuencias.exists():
+            # Primera escritura de la pestaña: se purgan las secuencias viejas del usuario en la guía
+            cls.objects.filter(
+                guia=guia, usuario=usuario, fecha_actualizacion__lt=timezone.now() - cls.RETENCION
+            ).delete()
+            try:
+                with transaction.atomic():
+                    cls.objects.create(guia=guia, usuario=usuario, client_id=client_id, ultimo_seq=client_seq)
+                return True, client_seq
+            except IntegrityError:
+                # Otra petición de la misma pestaña creó la fila: se compite con el UPDATE condicional
+                if secuencias.filter(ultimo_seq__lt=client_seq).update(ultimo_seq=client_seq, fecha_actualizacion=timezone.now()):
+                    return True, client_seq
+        return False, secuencias.values_list('ultimo_seq', flat=True).first() or 0
+
+
+class SubidaIncompatible(Exception):
+    """El bloque recibido no continúa la subida donde quedó (desplazamiento o tamaño incorrectos)."""
+
+
+class SubidaEvidencia(models.Model):
+    """
+    Subida por bloques y reanudable de una evidencia para una respuesta. Cada bloque se
+    escribe directamente en un archivo parcial del almacenamiento y se añade al SHA-256
+    incremental; `recibidos` solo avanza cuando el bloque completo quedó escrito, así que
+    un bloque fallido se reintenta desde ese punto. Al recibir el último byte se registra
+    el Archivo (deduplicado por hash) y se asocia a las evidencias de la respuesta.
+    El parcial se escribe por ruta, así que requiere un almacenamiento local (FileSystemStorage).
+    """
+    ESTADO_CHOICES = [
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+    ]
+    DIRECTORIO_PARCIALES = 'evidencias_parciales'
+    TIPOS_POR_MIME = {'image': 'imagen', 'video': 'video', 'application/pdf': 'pdf'}
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    guia = models.ForeignKey(GuiaAutocontrol, on_delete=models.CASCADE, related_name='subidas_evidencias')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subidas_evidencias')
+    numero_pregunta = models.IntegerField()
+    nombre = models.CharField(max_length=255)
+    tamano_total = models.BigIntegerField()
+    recibidos = models.BigIntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_curso')
+    archivo = models.ForeignKey(Archivo, on_delete=models.SET_NULL, null=True, blank=True, related_name='subidas_evidencias')
+    fecha_inicio = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Subida de Evidencia'
+        verbose_name_plural = 'Subidas de Evidencias'
+        ordering = ['-fecha_inicio']
+        indexes = [
+            Index(fields=['guia', 'usuario', 'numero_pregunta']),
+        ]
+
+    def __str__(self):
+        return f"Subida {self.nombre} ({self.recibidos}/{self.tamano_total} bytes)"
+
+    @property
+    def ruta_parcial(self):
+        """Ruta en disco del archivo parcial dentro del almacenamiento de Archivo."""
+        storage = Archivo._meta.get_field('archivo').storage
+        return storage.path(f'{self.DIRECTORIO_PARCIALES}/{self.token}.part')
+
+    def _hash_en_curso(self):
+        """
+        SHA-256 de los bytes ya recibidos. Normalmente sigue en memoria desde el bloque
+        anterior; si el proceso cambió o se reinició, se calcula una vez releyendo el parcial.
+        """
+        with _hashes_subidas_lock:
+            estado = _hashes_subidas.pop(self.token, None)
+        if estado and estado[0] == self.recibidos:
+            return estado[1]
+        hash_obj = hashlib.sha256()
+        if self.recibidos:
+            with open(self.ruta_parcial, 'rb') as f:
+                pendientes = self.recibidos
+                while pendientes:
+                    chunk = f.read(min(65536, pendientes))
+                    if not chunk:
+                        break
+                    hash_obj.update(chunk)
+                    pendientes -= len(chunk)
+        return hash_obj
+
+    def recibir_bloque(self, inicio, flujo, longitud):
+        """
+        Escribe en el parcial `longitud` bytes leídos de `flujo` a partir de `inicio`,
+        que debe coincidir con lo ya recibido. Retorna True si la subida quedó completa.
+        Si el bloque no llega entero, el parcial se recorta al último punto confirmado.
+        """
+        if self.estado != 'en_curso' or inicio != self.recibidos or inicio + longitud > self.tamano_total:
+            raise SubidaIncompatible(f'Se esperaba el byte {self.recibidos} de {self.tamano_total}')
+
+        hash_obj = self._hash_en_curso()
+        os.makedirs(os.path.dirname(self.ruta_parcial), exist_ok=True)
+        escritos = 0
+        with open(self.ruta_parcial, 'ab') as parcial:
+            try:
+                parcial.truncate(self.recibidos)
+                while escritos < longitud:
+                    chunk = flujo.read(min(65536, longitud - escritos))
+                    if not chunk:
+                        break
+                    parcial.write(chunk)
+                    hash_obj.update(chunk)
+                    escritos += len(chunk)
+            finally:
+                # Bloque cortado o error de lectura: se descarta lo escrito de este bloque
+                if escritos != longitud:
+                    parcial.truncate(self.recibidos)
+        if escritos != longitud:
+            raise SubidaIncompatible(f'El bloque llegó incompleto ({escritos} de {longitud} bytes)')
+
+        self.recibidos += longitud
+        SubidaEvidencia.objects.filter(pk=self.pk).update(recibidos=self.recibidos, fecha_actualizacion=timezone.now())
+        if self.recibidos < self.tamano_total:
+            with _hashes_subidas_lock:
+                _hashes_subidas[self.token] = (self.recibidos, hash_obj)
+                while len(_hashes_subidas) > MAXIMO_HASHES_SUBIDAS:
+                    _hashes_subidas.popitem(last=False)
+            return False
+        self._finalizar(hash_obj.hexdigest())
+        return True
+
+    def _tipo_archivo(self):
+        mime = mimetypes.guess_type(self.nombre)[0] or ''
+        return self.TIPOS_POR_MIME.get(mime) or self.TIPOS_POR_MIME.get(mime.split('/')[0], 'documento' if mime else 'otro')
+
+    def _finalizar(self, hash_sha256):
+        """
+        Registra el Archivo a partir del parcial y lo asocia a la respuesta de la pregunta.
+        El parcial solo se borra al confirmar la transacción; si algo falla, el archivo
+        almacenado se descarta y el parcial queda para reenviar el último bloque.
+        """
+        archivo = None
+        try:
+            with transaction.atomic():
+                archivo = Archivo.crear_desde_ruta(
+                    self.ruta_parcial,
+                    self.nombre,
+                    hash_sha256,
+                    nombre=self.nombre,
+                    tipo=self._tipo_archivo(),
+                    subido_por=self.usuario,
+                )
+                respuesta, _ = RespuestaGuia.objects.get_or_create(
+                    guia_id=self.guia_id,
+                    usuario_id=self.usuario_id,
+                    numero_pregunta=self.numero_pregunta
+                )
+                respuesta.evidencias.add(archivo)
+                self.archivo = archivo
+                self.estado = 'completada'
+                self.save(update_fields=['archivo', 'estado', 'fecha_actualizacion'])
+        except Exception:
+            if archivo is not None:
+                archivo.descartar_almacenado()
+            raise
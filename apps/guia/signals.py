@@ -1,36 +1,36 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from .models import RespuestaGuia, EvaluacionGuia
 
+_SIN_VALOR_ANTERIOR = object()
+
+
 @receiver(post_save, sender=RespuestaGuia)
 def actualizar_evaluacion(sender, instance, created, **kwargs):
     """
     Señal que se activa después de guardar una respuesta.
-    Actualiza completamente la evaluación correspondiente.
+    Aplica a la evaluación correspondiente solo el cambio de esta respuesta
+    (valor anterior -> valor nuevo) con un único UPDATE incremental.
+    Si no existe la evaluación, se creará cuando el usuario visite la guía.
     """
-    try:
-        evaluacion = EvaluacionGuia.objects.get(
-            guia=instance.guia, 
-            usuario=instance.usuario
+    anterior = None if created else getattr(instance, '_respuesta_anterior', _SIN_VALOR_ANTERIOR)
+    if anterior is _SIN_VALOR_ANTERIOR:
+        # La instancia no se leyó de la base de datos: no se conoce el valor previo
+        evaluacion = EvaluacionGuia.objects.filter(guia_id=instance.guia_id, usuario_id=instance.usuario_id).first()
+        if evaluacion:
+            evaluacion.actualizar_estadisticas()
+    else:
+        EvaluacionGuia.aplicar_cambio_respuesta(
+            instance.guia_id, instance.usuario_id, instance.numero_pregunta,
+            anterior, instance.respuesta, 1 if created else 0
         )
-        # Actualiza todos los campos relevantes
-        evaluacion.actualizar_estadisticas()
-        evaluacion.actualizar_respuestas_json()
-        
-        # Recalcula el porcentaje basado en respuestas válidas
-        respuestas_validas = RespuestaGuia.objects.filter(
-            guia=instance.guia,
-            usuario=instance.usuario,
-            respuesta__in=['si', 'no', 'na']
-        ).count()
-        
-        total_preguntas = instance.guia.total_preguntas
-        if total_preguntas > 0:
-            porcentaje = round((respuestas_validas / total_preguntas) * 100, 2)
-            evaluacion.porcentaje_cumplimiento = porcentaje
-            evaluacion.estado = 'completada' if porcentaje >= 100 else 'en_progreso'
-            evaluacion.save()
-            
-    except EvaluacionGuia.DoesNotExist:
-        # Si no existe la evaluación, se creará cuando el usuario visite la guía
-        pass
\ No newline at end of file
+    instance._respuesta_anterior = instance.respuesta
+
+
+@receiver(post_delete, sender=RespuestaGuia)
+def descontar_respuesta_eliminada(sender, instance, **kwargs):
+    """Descuenta de la evaluación la respuesta eliminada."""
+    EvaluacionGuia.aplicar_cambio_respuesta(
+        instance.guia_id, instance.usuario_id, instance.numero_pregunta,
+        getattr(instance, '_respuesta_anterior', instance.respuesta), None, -1
+    )
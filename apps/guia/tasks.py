@@ -1,11 +1,25 @@
 from celery import shared_task
-from .models import GuiaAutocontrol, EvaluacionGuia, RespuestaGuia
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from .models import GuiaAutocontrol, EvaluacionGuia, RespuestaGuia, DiarioRespuesta
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 import io, os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Ejecutor en proceso usado cuando no hay un worker de Celery configurado
+_ejecutor_local = None
+# Hilo único que vacía el diario de respuestas en el modo local
+_ejecutor_diario = None
+_diario_lock = threading.Lock()
+_diario_programado = False
 
 # Funciones de ayuda para refactorizar
 def _crear_tabla_respuestas(respuestas):
@@ -110,4 +124,100 @@ def generar_pdf_guia_async(guia_id, usuario_id, output_path):
     with open(output_path, 'wb') as f:
         f.write(pdf)
 
-    return output_path
\ No newline at end of file
+    return output_path
+
+@shared_task
+def extraer_contenido_guia_async(guia_id):
+    """Extrae el contenido de una guía fuera del ciclo de la petición y registra su estado."""
+    guia = GuiaAutocontrol.objects.select_related('archivo').get(pk=guia_id)
+    guia.procesar_extraccion()
+    return guia.estado_procesamiento
+
+def _obtener_ejecutor_local():
+    """Crea bajo demanda el pool de hilos del modo local."""
+    global _ejecutor_local
+    if _ejecutor_local is None:
+        _ejecutor_local = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'GUIA_EXTRACCION_HILOS', 2),
+            thread_name_prefix='extraccion-guias'
+        )
+    return _ejecutor_local
+
+def _extraer_en_hilo(guia_id):
+    """Ejecuta la extracción en un hilo del pool local y libera su conexión a la base de datos."""
+    try:
+        extraer_contenido_guia_async(guia_id)
+    except Exception as e:
+        logger.error(f"Error en la extracción en segundo plano de la guía {guia_id}: {e}")
+    finally:
+        connections.close_all()
+
+def encolar_extraccion(guia):
+    """
+    Programa la extracción de contenido de la guía según settings.GUIA_EXTRACCION_MODO:
+    - 'celery': envía la tarea al worker de Celery.
+    - 'local': la ejecuta en un pool de hilos del propio proceso.
+    - 'sincrono': la ejecuta inmediatamente (útil para comandos y pruebas).
+    En los modos en segundo plano la tarea se despacha cuando se confirma la transacción.
+    """
+    modo = getattr(settings, 'GUIA_EXTRACCION_MODO', 'local')
+    guia_id = guia.pk
+    GuiaAutocontrol.objects.filter(pk=guia_id).update(estado_procesamiento='pendiente', error_procesamiento='')
+
+    if modo == 'sincrono':
+        extraer_contenido_guia_async(guia_id)
+    elif modo == 'celery':
+        transaction.on_commit(lambda: extraer_contenido_guia_async.delay(guia_id))
+    else:
+        transaction.on_commit(lambda: _obtener_ejecutor_local().submit(_extraer_en_hilo, guia_id))
+
+
+@shared_task
+def aplicar_diario_respuestas_async(limite=None):
+    """
+    Vacía el diario de respuestas por lotes hasta que no queden entradas pendientes.
+    Aplica también las que quedaron sin aplicar si el proceso se detuvo.
+    Retorna el número de entradas aplicadas.
+    """
+    limite = limite or getattr(settings, 'GUIA_DIARIO_LOTE', 500)
+    aplicadas = 0
+    while True:
+        lote = DiarioRespuesta.aplicar_lote(limite)
+        aplicadas += lote
+        if lote < limite:
+            return aplicadas
+
+def _aplicar_diario_en_hilo():
+    """Vacía el diario en el hilo del modo local y libera su conexión a la base de datos."""
+    global _diario_programado
+    with _diario_lock:
+        # Las entradas que lleguen durante el vaciado programan una nueva pasada
+        _diario_programado = False
+    try:
+        aplicar_diario_respuestas_async()
+    except Exception as e:
+        logger.error(f"Error al aplicar el diario de respuestas: {e}")
+    finally:
+        connections.close_all()
+
+def programar_aplicacion_diario():
+    """
+    Programa el vaciado del diario de respuestas según settings.GUIA_DIARIO_APLICACION
+    ('celery', 'local' o 'sincrono'). En el modo local las peticiones que llegan mientras
+    hay un vaciado pendiente no encolan otro.
+    """
+    global _ejecutor_diario, _diario_programado
+    modo = getattr(settings, 'GUIA_DIARIO_APLICACION', 'local')
+
+    if modo == 'sincrono':
+        aplicar_diario_respuestas_async()
+    elif modo == 'celery':
+        transaction.on_commit(lambda: aplicar_diario_respuestas_async.delay())
+    else:
+        with _diario_lock:
+            if _diario_programado:
+                return
+            _diario_programado = True
+            if _ejecutor_diario is None:
+                _ejecutor_diario = ThreadPoolExecutor(max_workers=1, thread_name_prefix='diario-respuestas')
+        transaction.on_commit(lambda: _ejecutor_diario.submit(_aplicar_diario_en_hilo))
@@ -8,7 +8,16 @@ urlpatterns = [
     path('', views.GuiaListView.as_view(), name='lista'),
     # Detalle de una guía específica con formulario
     path('guia/<int:pk>/', views.detalle_guia, name='detalle'),
+    # API de solo lectura: estructura versionada (cache larga) y respuestas del usuario
+    path('api/guia/<int:pk>/estructura/', views.api_estructura_guia, name='api_estructura'),
+    path('api/guia/<int:pk>/estructura/<str:version>/', views.api_estructura_guia, name='api_estructura_version'),
+    path('api/guia/<int:pk>/respuestas/', views.api_respuestas_guia, name='api_respuestas'),
     path('guardar_respuesta/<int:guia_pk>/', views.guardar_respuesta, name='guardar_respuesta'),
+    # Autoguardado por lotes con número de secuencia
+    path('guardar_cambios/<int:guia_pk>/', views.guardar_cambios, name='guardar_cambios'),
+    # Subida reanudable de evidencias por bloques
+    path('guia/<int:guia_pk>/evidencias/', views.iniciar_subida_evidencia, name='iniciar_subida_evidencia'),
+    path('evidencias/subida/<uuid:token>/', views.subir_bloque_evidencia, name='subir_bloque_evidencia'),
     # Completar evaluación
     path('guia/<int:guia_pk>/completar/', views.completar_evaluacion, name='completar_evaluacion'),
     # Resumen de evaluación
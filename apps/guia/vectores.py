@@ -0,0 +1,71 @@
+"""
+Vectores de respuestas empaquetados.
+
+Cada evaluación guarda sus respuestas como bytes: un código de ancho fijo por pregunta,
+en el orden del índice de la guía. Las estadísticas de un usuario se obtienen contando
+bytes y los informes de una guía cargan todos los vectores en una matriz de NumPy
+(usuarios x preguntas) que se agrega en una sola pasada.
+Los códigos son ASCII para que el vector pueda modificarse byte a byte desde SQL.
+"""
+
+CODIGO_EN_BLANCO = b'-'
+CODIGOS_RESPUESTA = {'si': b'S', 'no': b'N', 'na': b'A'}
+
+
+def codigo_respuesta(respuesta):
+    """Código de un valor de respuesta; None y la cadena vacía quedan en blanco."""
+    return CODIGOS_RESPUESTA.get(respuesta, CODIGO_EN_BLANCO)
+
+
+def empaquetar(respuestas, posiciones, total):
+    """
+    Construye el vector de `total` preguntas a partir de pares (numero_pregunta, respuesta).
+    `posiciones` es {numero_pregunta: posición en el índice}; las preguntas fuera del índice se ignoran.
+    """
+    vector = bytearray(CODIGO_EN_BLANCO * total)
+    for numero_pregunta, respuesta in respuestas:
+        posicion = posiciones.get(numero_pregunta)
+        if posicion is not None:
+            vector[posicion] = codigo_respuesta(respuesta)[0]
+    return bytes(vector)
+
+
+def contar(vector):
+    """Cuenta las respuestas si/no/na de un vector."""
+    vector = bytes(vector)
+    return {clave: vector.count(codigo) for clave, codigo in CODIGOS_RESPUESTA.items()}
+
+
+def matriz_respuestas(vectores, total):
+    """
+    Apila los vectores de una guía en una matriz uint8 de (vectores x total) sin copiar
+    byte a byte. Los vectores de otra longitud (desactualizados) se descartan.
+    """
+    import numpy as np
+
+    filas = [bytes(vector) for vector in vectores if len(vector) == total]
+    if not filas or not total:
+        return np.zeros((len(filas), total), dtype=np.uint8)
+    return np.frombuffer(b''.join(filas), dtype=np.uint8).reshape(len(filas), total)
+
+
+def estadisticas_por_pregunta(matriz, preguntas):
+    """
+    Agrega una matriz de respuestas por columna. Retorna, en el orden de `preguntas`,
+    un dict por pregunta con los conteos de si/no/na/sin_responder.
+    """
+    conteos = {
+        clave: (matriz == codigo[0]).sum(axis=0)
+        for clave, codigo in CODIGOS_RESPUESTA.items()
+    }
+    sin_responder = matriz.shape[0] - conteos['si'] - conteos['no'] - conteos['na']
+    return [
+        {
+            'numero_pregunta': numero_pregunta,
+            'si': int(conteos['si'][posicion]),
+            'no': int(conteos['no'][posicion]),
+            'na': int(conteos['na'][posicion]),
+            'sin_responder': int(sin_responder[posicion]),
+        }
+        for posicion, numero_pregunta in enumerate(preguntas)
+    ]
@@ -3,11 +3,21 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
+from django.contrib.auth.views import redirect_to_login
+from asgiref.sync import sync_to_async
+from functools import wraps
 from django.db import transaction
-from django.db.models import Count, Q
-from django.core.paginator import Paginator
+from django.db.models import Avg, Case, Count, IntegerField, Max, OuterRef, Prefetch, Q, Subquery, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.contrib.messages import get_messages
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from reportlab.lib.pagesizes import A4
@@ -15,18 +25,48 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from .models import GuiaAutocontrol, RespuestaGuia, EvaluacionGuia
+from .models import (
+    GuiaAutocontrol, RespuestaGuia, EvaluacionGuia, ConflictoVersionEvaluacion, DiarioRespuesta,
+    SubidaEvidencia, SubidaIncompatible, SecuenciaAutoguardado, VERSION_PARSER,
+)
+from .indice import VERSION_INDICE
 from apps.dashboard.models import Archivo
-from .tasks import generar_pdf_guia_async
+from .tasks import generar_pdf_guia_async, encolar_extraccion, programar_aplicacion_diario
 import io
 import json
 import logging
 import os
+import re
 from django.conf import settings
+from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+
+def login_required_async(vista):
+    """Equivalente de login_required para vistas async (Django 4.2 no lo admite en ellas)."""
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        # request.user se resuelve contra la sesión y la base de datos: se evalúa en el hilo síncrono
+        autenticado = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not autenticado:
+            return redirect_to_login(request.get_full_path())
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+async def _obtener_guia(pk, **filtros):
+    """get_object_or_404 asíncrono para las guías."""
+    try:
+        return await GuiaAutocontrol.objects.aget(pk=pk, **filtros)
+    except GuiaAutocontrol.DoesNotExist:
+        raise Http404('No existe la guía solicitada.')
+
+
+async def _obtener_guia_activa(pk):
+    return await _obtener_guia(pk, activa=True)
+
 class GuiaListView(LoginRequiredMixin, ListView):
     """
     Vista para listar todas las guías de autocontrol disponibles.
@@ -36,51 +76,57 @@ class GuiaListView(LoginRequiredMixin, ListView):
     context_object_name = 'guias'
     paginate_by = 10
 
-    def get_queryset(self):
+    def _guias_visibles(self):
+        """Guías listas para evaluar, sin el contenido procesado (la lista no lo usa)."""
         return GuiaAutocontrol.objects.filter(
             activa=True,
+            estado_procesamiento='lista',
             archivo__es_formulario=True
-        ).select_related('archivo').prefetch_related('evaluaciones')
+        ).defer('contenido_procesado', 'indice_preguntas')
+
+    def _estado_usuario(self):
+        """Estado de la evaluación del usuario en cada guía (NULL si no la empezó)."""
+        return Subquery(
+            EvaluacionGuia.objects.filter(guia=OuterRef('pk'), usuario=self.request.user).values('estado')[:1]
+        )
+
+    def get_queryset(self):
+        # Solo se precarga la evaluación del usuario actual; las completadas van al final
+        return self._guias_visibles().select_related('archivo').annotate(
+            estado_usuario=self._estado_usuario()
+        ).order_by(
+            Case(When(estado_usuario='completada', then=1), default=0),
+            '-fecha_procesamiento'
+        ).prefetch_related(Prefetch(
+            'evaluaciones',
+            queryset=EvaluacionGuia.objects.filter(usuario=self.request.user).defer('vector_respuestas'),
+            to_attr='evaluaciones_usuario'
+        ))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         guias = list(context['guias'])
-        usuario = self.request.user
-        
-        evaluaciones_usuario = EvaluacionGuia.objects.filter(
-            usuario=usuario,
-            guia__in=guias
-        ).select_related('guia')
-        
-        evaluaciones_por_guia = {e.guia_id: e for e in evaluaciones_usuario}
-         
         for guia in guias:
-            guia.evaluacion_usuario = evaluaciones_por_guia.get(guia.id)
-            
-        def is_completed(guia):
-            ev = evaluaciones_por_guia.get(guia.id)
-            return 1 if ev and ev.estado == 'completada' else 0
-        guias.sort(key=is_completed)
+            guia.evaluacion_usuario = guia.evaluaciones_usuario[0] if guia.evaluaciones_usuario else None
 
-        # Usar listas por comprensión para clasificar en una sola línea por tipo
-        guias_completadas = [guia for guia in guias if evaluaciones_por_guia.get(guia.id) and evaluaciones_por_guia[guia.id].estado == 'completada']
-        guias_en_progreso = [guia for guia in guias if evaluaciones_por_guia.get(guia.id) and evaluaciones_por_guia[guia.id].estado == 'en_progreso']
-        guias_pendientes = [guia for guia in guias if not evaluaciones_por_guia.get(guia.id) or evaluaciones_por_guia[guia.id].estado == 'no_iniciada']
+        # Totales de todas las guías (no solo de la página) en una sola consulta
+        totales = self._guias_visibles().annotate(estado_usuario=self._estado_usuario()).aggregate(
+            total_guias=Count('pk'),
+            total_completadas=Count('pk', filter=Q(estado_usuario='completada')),
+            total_en_progreso=Count('pk', filter=Q(estado_usuario='en_progreso')),
+            total_pendientes=Count('pk', filter=Q(estado_usuario__isnull=True) | Q(estado_usuario='no_iniciada')),
+        )
 
         context.update({
             'guias': guias,
-            'guias_completadas': guias_completadas,
-            'guias_en_progreso': guias_en_progreso,
-            'guias_pendientes': guias_pendientes,
-            'total_guias': len(guias),
-            'total_completadas': len(guias_completadas),
-            'total_en_progreso': len(guias_en_progreso),
-            'total_pendientes': len(guias_pendientes),
+            'guias_completadas': [guia for guia in guias if guia.estado_usuario == 'completada'],
+            'guias_en_progreso': [guia for guia in guias if guia.estado_usuario == 'en_progreso'],
+            'guias_pendientes': [guia for guia in guias if guia.estado_usuario in (None, 'no_iniciada')],
+            **totales,
         })
         return context
 
-@login_required
-def _handle_post_request(request, guia):
+async def _handle_post_request(request, guia):
     """
     Maneja la lógica para guardar respuestas vía AJAX.
     """
@@ -93,13 +139,19 @@ def _handle_post_request(request, guia):
         if numero_pregunta is None:
             return JsonResponse({'status': 'error', 'message': 'Número de pregunta es requerido.'}, status=400)
 
-        evaluacion, _ = EvaluacionGuia.objects.get_or_create(
+        if _autoguardado_diferido():
+            progreso = await _registrar_en_diario(
+                guia, request.user, {numero_pregunta: (respuesta if respuesta else None, fundamentacion)}
+            )
+            return _respuesta_diferida('Respuesta registrada.', progreso)
+
+        evaluacion, _ = await EvaluacionGuia.objects.aget_or_create(
             guia=guia,
             usuario=request.user,
             defaults={'estado': 'en_progreso'}
         )
         
-        RespuestaGuia.objects.update_or_create(
+        await RespuestaGuia.objects.aupdate_or_create(
             guia=guia,
             usuario=request.user,
             numero_pregunta=numero_pregunta,
@@ -109,10 +161,9 @@ def _handle_post_request(request, guia):
             }
         )
 
-        porcentaje_completado, preguntas_respondidas, total_preguntas = _calculate_progress(guia, request.user)
-        evaluacion.estado = 'completada' if porcentaje_completado == 100 else 'en_progreso'
-        evaluacion.porcentaje_cumplimiento = porcentaje_completado
-        evaluacion.save()
+        # La señal de RespuestaGuia ya aplicó el cambio a los contadores de la evaluación
+        await evaluacion.arefresh_from_db(fields=CAMPOS_PROGRESO)
+        porcentaje_completado, preguntas_respondidas, total_preguntas = _progreso_evaluacion(evaluacion, guia, refrescar=False)
 
         return JsonResponse({
             'status': 'success',
@@ -127,108 +178,355 @@ def _handle_post_request(request, guia):
         logger.error(f'Error al guardar la respuesta: {str(e)}')
         return JsonResponse({'status': 'error', 'message': f'Error al guardar la respuesta: {str(e)}'}, status=500)
 
+def _etag_detalle(guia, usuario, evaluacion):
+    """
+    ETag del detalle de una guía para un usuario: cambia con el archivo o el contenido de
+    la guía, con cada escritura en la evaluación (versión) y con cada entrada del diario.
+    """
+    ultima_pendiente = DiarioRespuesta.objects.filter(guia=guia, usuario=usuario).aggregate(ultima=Max('pk'))['ultima']
+    return quote_etag('-'.join(str(parte) for parte in (
+        guia.pk,
+        guia.hash_archivo[:16],
+        int(guia.fecha_procesamiento.timestamp()) if guia.fecha_procesamiento else 0,
+        usuario.pk,
+        evaluacion.version if evaluacion else 0,
+        ultima_pendiente or 0,
+    )))
+
+
+VERSION_PLANTILLA_ARBOL = 1
+
+
+def _arbol_preguntas_html(guia):
+    """
+    HTML del árbol de preguntas de la guía, igual para todos los usuarios. Se renderiza una
+    vez y se guarda en cache junto a su huella (hash del archivo, versión del parser y de la
+    plantilla); las respuestas de cada usuario se aplican en el navegador sobre este HTML.
+    """
+    tablas = (guia.contenido_procesado or {}).get('tablas_cuestionario', [])
+    if not tablas:
+        return ''
+    cache_key = f'guia_{guia.pk}_arbol'
+    huella = (guia.hash_archivo, VERSION_PARSER, VERSION_PLANTILLA_ARBOL)
+    en_cache = cache.get(cache_key)
+    if en_cache and en_cache[0] == huella:
+        html = en_cache[1]
+    else:
+        html = render_to_string('guia/_arbol_preguntas.html', {'tablas_cuestionario': tablas})
+        cache.set(cache_key, (huella, html), timeout=3600)
+    return mark_safe(html)
+
+
 @login_required
 def _handle_get_request(request, guia):
     """
-    Maneja la lógica para mostrar el detalle de la guía.
+    Maneja la lógica para mostrar el detalle de la guía. Es de solo lectura: la evaluación
+    no se crea aquí y solo se escribe si el estado derivado de sus contadores cambió.
+    Una recarga sin cambios responde 304 sin volver a construir ni renderizar el cuestionario.
     """
-    preguntas_por_categoria = []
-    all_preguntas_flat = []
-    
-    if guia.contenido_procesado and 'tablas_cuestionario' in guia.contenido_procesado:
-        respuestas_usuario = RespuestaGuia.objects.filter(
-            guia=guia,
-            usuario=request.user
-        ).values('numero_pregunta', 'respuesta', 'fundamentacion')
-        
-        respuestas_dict = {str(r['numero_pregunta']): r for r in respuestas_usuario}
-        
-        for categoria in guia.contenido_procesado['tablas_cuestionario']:
-            cat = {
-                'categoria': categoria.get('categoria', ''),
-                'componente_a_evaluar': categoria.get('componente_a_evaluar', ''),
-                'bloques': []
-            }
-            for bloque in categoria.get('bloques', []):
-                blq = {'encabezado': bloque.get('encabezado', ''), 'preguntas': []}
-                for pregunta in bloque.get('preguntas', []):
-                    num = str(pregunta.get('numero_pregunta'))
-                    pregunta_copy = pregunta.copy()
-                    
-                    pregunta_copy.update({
-                        'user_respuesta': respuestas_dict.get(num, {}).get('respuesta'),
-                        'user_fundamentacion': respuestas_dict.get(num, {}).get('fundamentacion')
-                    })
-                    blq['preguntas'].append(pregunta_copy)
-                    all_preguntas_flat.append(pregunta_copy)
-                cat['bloques'].append(blq)
-            preguntas_por_categoria.append(cat)
-    
-    # Recalcular progreso para el contexto
-    total_preguntas = len(all_preguntas_flat)
-    preguntas_respondidas = sum(1 for p in all_preguntas_flat if p.get('user_respuesta') in ['si', 'no', 'na'])
-    porcentaje_completado = round((preguntas_respondidas / total_preguntas * 100)) if total_preguntas > 0 else 0
-    
-    evaluacion, _ = EvaluacionGuia.objects.get_or_create(
-        guia=guia,
-        usuario=request.user,
-        defaults={'estado': 'en_progreso'}
-    )
-    evaluacion.estado = 'completada' if porcentaje_completado == 100 else 'en_progreso'
-    evaluacion.porcentaje_cumplimiento = porcentaje_completado
-    evaluacion.save()
+    evaluacion = EvaluacionGuia.objects.filter(guia=guia, usuario=request.user).first()
+    if evaluacion:
+        evaluacion.guia = guia
+        evaluacion.sincronizar_estado()
+
+    etag = _etag_detalle(guia, request.user, evaluacion)
+    # Con mensajes pendientes se renderiza siempre para no ocultarlos tras un 304
+    if not len(get_messages(request)):
+        no_modificada = get_conditional_response(request, etag=etag)
+        if no_modificada is not None:
+            return no_modificada
+
+    # Las entradas del diario aún no aplicadas prevalecen: el usuario ve sus propias escrituras
+    respuestas_efectivas = DiarioRespuesta.respuestas_efectivas(guia.pk, request.user.pk)
+
+    # Progreso para el contexto con el índice de preguntas (incluye las entradas pendientes del diario)
+    porcentaje_completado, preguntas_respondidas, total_preguntas = _calcular_progreso(guia, respuestas_efectivas)
 
     context = {
         'guia': guia,
-        'preguntas_por_categoria': preguntas_por_categoria if preguntas_por_categoria else None,
-        'preguntas_planas': all_preguntas_flat,
+        'arbol_preguntas': _arbol_preguntas_html(guia),
+        'datos_usuario': {
+            'respuestas': _respuestas_serializadas(respuestas_efectivas),
+            'porcentaje_completado': porcentaje_completado,
+        },
         'evaluacion': evaluacion,
         'total_preguntas': total_preguntas,
         'preguntas_respondidas': preguntas_respondidas,
         'porcentaje_completado': porcentaje_completado,
     }
-    return render(request, 'guia/detalle_guia.html', context)
+    response = render(request, 'guia/detalle_guia.html', context)
+    response.headers['ETag'] = etag
+    # Página por usuario: el navegador la guarda pero la revalida en cada visita
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+def _respuestas_serializadas(respuestas):
+    """{"numero_pregunta": {respuesta, fundamentacion}} de las preguntas respondidas, para JSON."""
+    return {
+        str(numero_pregunta): {'respuesta': respuesta, 'fundamentacion': fundamentacion or ''}
+        for numero_pregunta, (respuesta, fundamentacion) in respuestas.items()
+        if respuesta
+    }
 
-def _calculate_progress(guia, user):
+
+def _version_estructura(guia):
     """
-    Calcula el progreso de una guía para un usuario específico.
+    Versión de la estructura de una guía: cambia con el archivo, con el parser que lo
+    procesó y con el formato del índice. Forma parte de la URL de la API de estructura.
     """
-    all_preguntas_flat = []
-    if guia.contenido_procesado and 'tablas_cuestionario' in guia.contenido_procesado:
-        for categoria in guia.contenido_procesado['tablas_cuestionario']:
-            for bloque in categoria.get('bloques', []):
-                for pregunta in bloque.get('preguntas', []):
-                    all_preguntas_flat.append(pregunta)
-    
-    respuestas_usuario_actualizadas = RespuestaGuia.objects.filter(
-        guia=guia,
-        usuario=user
-    ).values('numero_pregunta', 'respuesta')
-    
-    respuestas_dict_actualizadas = {r['numero_pregunta']: r for r in respuestas_usuario_actualizadas}
-    
-    total_preguntas = len(all_preguntas_flat)
+    return f'{guia.hash_archivo[:16] or "sin-archivo"}-{VERSION_PARSER}-{VERSION_INDICE}'
+
+
+@login_required
+def api_estructura_guia(request, pk, version=None):
+    """
+    Estructura de la guía en JSON (contenido_procesado e índice de preguntas), sin datos
+    del usuario. La URL incluye la versión, así que la respuesta no cambia nunca y se
+    cachea por un año; una versión que ya no es la vigente redirige a la actual.
+    Solo se sirve de una guía activa y ya procesada: mientras no lo esté se responde sin
+    cache. El título y el propósito, editables sin cambiar la versión, van en la API de respuestas.
+    """
+    guia = get_object_or_404(GuiaAutocontrol, pk=pk)
+    if not guia.activa:
+        response = JsonResponse({'status': 'error', 'message': 'La guía no está activa.'}, status=404)
+        patch_cache_control(response, no_store=True)
+        return response
+    if guia.estado_procesamiento != 'lista':
+        response = JsonResponse({
+            'status': 'error',
+            'message': 'La guía aún no está procesada.',
+            'estado_procesamiento': guia.estado_procesamiento,
+        }, status=409)
+        patch_cache_control(response, no_store=True)
+        return response
+
+    version_actual = _version_estructura(guia)
+    if version != version_actual:
+        response = redirect('guia:api_estructura_version', pk=guia.pk, version=version_actual)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    etag = quote_etag(version_actual)
+    no_modificada = get_conditional_response(request, etag=etag)
+    if no_modificada is None:
+        response = JsonResponse({
+            'id': guia.pk,
+            'version': version_actual,
+            'contenido': guia.contenido_procesado,
+            'indice': guia.get_indice_persistido(),
+        })
+    else:
+        response = no_modificada
+    response.headers['ETag'] = etag
+    # Privada: la guía solo se sirve a usuarios autenticados y no debe quedar en caches compartidas
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+
+@login_required
+def api_respuestas_guia(request, pk):
+    """
+    Respuestas del usuario en una guía (incluye las entradas pendientes del diario) y su
+    progreso. Es la parte pequeña que viaja en cada visita: se revalida con If-None-Match
+    usando el mismo ETag que el detalle de la guía.
+    """
+    guia = get_object_or_404(GuiaAutocontrol, pk=pk)
+    evaluacion = EvaluacionGuia.objects.filter(guia=guia, usuario=request.user).first()
+    etag = _etag_detalle(guia, request.user, evaluacion)
+    no_modificada = get_conditional_response(request, etag=etag)
+    if no_modificada is None:
+        respuestas_efectivas = DiarioRespuesta.respuestas_efectivas(guia.pk, request.user.pk)
+        porcentaje_completado, preguntas_respondidas, total_preguntas = _calcular_progreso(guia, respuestas_efectivas)
+        response = JsonResponse({
+            'estructura': reverse('guia:api_estructura_version', kwargs={
+                'pk': guia.pk, 'version': _version_estructura(guia)
+            }),
+            'titulo': guia.titulo_guia,
+            'proposito': guia.proposito,
+            'estado': evaluacion.estado if evaluacion else None,
+            'respuestas': _respuestas_serializadas(respuestas_efectivas),
+            'porcentaje_completado': porcentaje_completado,
+            'preguntas_respondidas': preguntas_respondidas,
+            'total_preguntas': total_preguntas,
+        })
+    else:
+        response = no_modificada
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+# Campos de la evaluación que se releen para informar el progreso
+CAMPOS_PROGRESO = [
+    'estado', 'porcentaje_cumplimiento', 'fecha_completado', 'total_respuestas',
+    'respuestas_si', 'respuestas_no', 'respuestas_na', 'version',
+]
+
+
+def _calcular_progreso(guia, respuestas):
+    """
+    Progreso de un usuario a partir de sus respuestas {numero_pregunta: (respuesta, fundamentacion)},
+    contando sobre el índice de preguntas de la guía.
+    Retorna (porcentaje completado, preguntas respondidas, total de preguntas).
+    """
+    preguntas = guia.get_indice()['preguntas']
+    total_preguntas = len(preguntas)
     preguntas_respondidas = sum(
-        1 for p in all_preguntas_flat 
-        if respuestas_dict_actualizadas.get(p.get('numero_pregunta', '')) and 
-           respuestas_dict_actualizadas.get(p.get('numero_pregunta', '')).get('respuesta') in ['si', 'no', 'na']
+        1 for numero in preguntas if respuestas.get(numero, (None,))[0] in ('si', 'no', 'na')
     )
     porcentaje_completado = round((preguntas_respondidas / total_preguntas * 100)) if total_preguntas > 0 else 0
-    
     return porcentaje_completado, preguntas_respondidas, total_preguntas
 
-@login_required
-def detalle_guia(request, pk):
-    guia = get_object_or_404(GuiaAutocontrol, pk=pk)
+
+def _progreso_evaluacion(evaluacion, guia, refrescar=True):
+    """
+    Lee los contadores incrementales de la evaluación y calcula el progreso del usuario.
+    Retorna (porcentaje completado, preguntas respondidas, total de preguntas).
+    """
+    if refrescar:
+        evaluacion.refresh_from_db(fields=CAMPOS_PROGRESO)
+    preguntas_respondidas = evaluacion.respuestas_si + evaluacion.respuestas_no + evaluacion.respuestas_na
+    total_preguntas = guia.total_preguntas
+    porcentaje_completado = round((preguntas_respondidas / total_preguntas * 100)) if total_preguntas else 0
+    return porcentaje_completado, preguntas_respondidas, total_preguntas
+
+@login_required_async
+async def detalle_guia(request, pk):
+    guia = await _obtener_guia(pk)
 
     if request.method == 'POST':
-        return _handle_post_request(request, guia)
+        return await _handle_post_request(request, guia)
     
-    return _handle_get_request(request, guia)
+    # El render de la página sigue siendo síncrono
+    return await sync_to_async(_handle_get_request)(request, guia)
 
-@login_required
-@transaction.atomic
-def guardar_respuesta(request, guia_pk):
+RESPUESTAS_VALIDAS = {valor for valor, _ in RespuestaGuia.RESPUESTA_CHOICES} | {None}
+
+
+def _validar_lote_respuestas(data):
+    """
+    Valida el payload completo de guardar_respuesta (una respuesta o una lista).
+    Retorna (respuestas por número de pregunta, errores). Si una pregunta se repite,
+    prevalece la última aparición.
+    """
+    items = data if isinstance(data, list) else [data]
+    respuestas = {}
+    errores = []
+    if not items:
+        errores.append('No se recibieron respuestas.')
+    for indice, item in enumerate(items):
+        if not isinstance(item, dict):
+            errores.append(f'Elemento {indice}: se esperaba un objeto.')
+            continue
+        numero_pregunta = item.get('numero_pregunta')
+        respuesta = item.get('respuesta')
+        fundamentacion = item.get('fundamentacion', '')
+        if respuesta == '':
+            # Las preguntas sin marcar llegan como cadena vacía
+            respuesta = None
+        if isinstance(numero_pregunta, bool) or not isinstance(numero_pregunta, int):
+            errores.append(f'Elemento {indice}: número de pregunta inválido.')
+        elif respuesta not in RESPUESTAS_VALIDAS:
+            errores.append(f'Pregunta {numero_pregunta}: respuesta inválida.')
+        elif not isinstance(fundamentacion, str):
+            errores.append(f'Pregunta {numero_pregunta}: la fundamentación debe ser texto.')
+        else:
+            respuestas[numero_pregunta] = (respuesta, fundamentacion)
+    return respuestas, errores
+
+
+def _guardar_lote(guia, usuario, respuestas):
+    """
+    Guarda un lote ya validado con un único upsert y recalcula la evaluación una sola vez.
+    Retorna la evaluación actualizada. No abre una transacción: el upsert es una sola
+    sentencia y el recálculo se escribe con un UPDATE condicional a la versión.
+    """
+    RespuestaGuia.objects.bulk_create(
+        [
+            RespuestaGuia(
+                guia=guia,
+                usuario=usuario,
+                numero_pregunta=numero_pregunta,
+                respuesta=respuesta,
+                fundamentacion=fundamentacion
+            )
+            for numero_pregunta, (respuesta, fundamentacion) in respuestas.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['guia', 'usuario', 'numero_pregunta'],
+        update_fields=['respuesta', 'fundamentacion', 'fecha_respuesta', 'fecha_modificacion']
+    )
+
+    evaluacion, _ = EvaluacionGuia.objects.get_or_create(
+        guia=guia,
+        usuario=usuario,
+        defaults={'estado': 'en_progreso'}
+    )
+    # bulk_create no dispara señales: se recalcula la evaluación una sola vez
+    evaluacion.guia = guia
+    evaluacion.actualizar_estadisticas()
+    return evaluacion
+
+
+async def _guardar_lote_respuestas(guia, usuario, respuestas):
+    """Versión async de _guardar_lote: el upsert y el recálculo se hacen en el hilo síncrono."""
+    return await sync_to_async(_guardar_lote)(guia, usuario, respuestas)
+
+
+def _aplicar_lote_secuenciado(guia, usuario, client_id, client_seq, respuestas, diferido):
+    """
+    Reclama client_seq y aplica el lote en la misma transacción. Si el lote es un
+    reintento o llegó atrasado no se escribe nada. Si la aplicación falla, la secuencia
+    también se revierte y el cliente puede reenviar el lote.
+    Retorna (aplicado, ack_seq, evaluacion o None).
+    """
+    with transaction.atomic():
+        aplicado, ack_seq = SecuenciaAutoguardado.reclamar(guia, usuario, client_id, client_seq)
+        if not aplicado:
+            return False, ack_seq, EvaluacionGuia.objects.filter(guia=guia, usuario=usuario).first()
+        if diferido:
+            DiarioRespuesta.registrar(guia, usuario, respuestas)
+            return True, ack_seq, None
+        return True, ack_seq, _guardar_lote(guia, usuario, respuestas)
+
+
+def _autoguardado_diferido():
+    return getattr(settings, 'GUIA_AUTOGUARDADO_MODO', 'directo') == 'diario'
+
+
+def _progreso_efectivo(guia, usuario):
+    """Progreso optimista del usuario: respuestas guardadas más las pendientes del diario."""
+    return _calcular_progreso(guia, DiarioRespuesta.respuestas_efectivas(guia.pk, usuario.pk))
+
+
+async def _registrar_en_diario(guia, usuario, respuestas):
+    """
+    Modo write-behind: anota un lote ya validado en el diario con un solo INSERT y
+    programa su aplicación. Retorna el progreso optimista del usuario.
+    """
+    await sync_to_async(DiarioRespuesta.registrar)(guia, usuario, respuestas)
+    progreso = await sync_to_async(_progreso_efectivo)(guia, usuario)
+    await sync_to_async(programar_aplicacion_diario)()
+    return progreso
+
+
+def _respuesta_diferida(mensaje, progreso, **extra):
+    """Respuesta JSON de un guardado anotado en el diario y pendiente de aplicar."""
+    porcentaje_completado, preguntas_respondidas, total_preguntas = progreso
+    return JsonResponse({
+        'status': 'success',
+        'message': mensaje,
+        'diferido': True,
+        **extra,
+        'porcentaje_completado': porcentaje_completado,
+        'preguntas_respondidas': preguntas_respondidas,
+        'total_preguntas': total_preguntas
+    })
+
+
+@login_required_async
+async def guardar_respuesta(request, guia_pk):
     # Solo permite método POST
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
@@ -236,49 +534,20 @@ def guardar_respuesta(request, guia_pk):
     try:
         # Carga el JSON recibido y obtiene la guía y el usuario
         data = json.loads(request.body)
-        guia = get_object_or_404(GuiaAutocontrol, pk=guia_pk, activa=True)
+        guia = await _obtener_guia_activa(guia_pk)
         usuario = request.user
 
-        # Permite recibir una lista de respuestas o una sola
-        responses_to_process = data if isinstance(data, list) else [data]
-
-        # Guarda o actualiza cada respuesta recibida
-        for item in responses_to_process:
-            numero_pregunta = item.get('numero_pregunta')
-            respuesta = item.get('respuesta')
-            fundamentacion = item.get('fundamentacion', '')
+        # Valida el lote completo antes de escribir nada
+        respuestas, errores = _validar_lote_respuestas(data)
+        if errores:
+            return JsonResponse({'status': 'error', 'message': 'Datos de respuesta inválidos.', 'errores': errores}, status=400)
 
-            RespuestaGuia.objects.update_or_create(
-                guia=guia,
-                usuario=usuario,
-                numero_pregunta=numero_pregunta,
-                defaults={
-                    'respuesta': respuesta,
-                    'fundamentacion': fundamentacion
-                }
-            )
+        if _autoguardado_diferido():
+            progreso = await _registrar_en_diario(guia, usuario, respuestas)
+            return _respuesta_diferida('Respuestas registradas.', progreso)
 
-        # Obtiene o crea la evaluación del usuario para la guía
-        evaluacion, _ = EvaluacionGuia.objects.get_or_create(
-            guia=guia,
-            usuario=usuario,
-            defaults={'estado': 'en_progreso'}
-        )
-        # Calcula el total de preguntas y cuántas ha respondido el usuario
-        total_preguntas = guia.total_preguntas
-        respuestas_usuario = RespuestaGuia.objects.filter(
-            guia=guia,
-            usuario=usuario,
-            respuesta__in=['si', 'no', 'na']
-        ).count()
-        porcentaje_completado = round((respuestas_usuario / total_preguntas * 100)) if total_preguntas else 0
-
-        # Actualiza el estado y porcentaje de la evaluación
-        evaluacion.estado = 'completada' if porcentaje_completado == 100 else 'en_progreso'
-        evaluacion.porcentaje_cumplimiento = porcentaje_completado
-        evaluacion.save()
-        # Actualiza campos denormalizados y estadísticas
-        evaluacion.actualizar_estadisticas()
+        evaluacion = await _guardar_lote_respuestas(guia, usuario, respuestas)
+        porcentaje_completado, respuestas_usuario, total_preguntas = _progreso_evaluacion(evaluacion, guia, refrescar=False)
 
         # Devuelve respuesta JSON con el progreso actualizado
         return JsonResponse({
@@ -289,25 +558,199 @@ def guardar_respuesta(request, guia_pk):
             'total_preguntas': total_preguntas
         })
 
+    except Http404:
+        raise
+    except ConflictoVersionEvaluacion as e:
+        logger.warning(f"Conflicto de versión en guardar_respuesta: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': 'La evaluación se está modificando en otra pestaña. Intenta nuevamente.'}, status=409)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Formato JSON inválido.'}, status=400)
     except Exception as e:
         # Loguea y responde con error si algo falla
         logger.error(f"Error en guardar_respuesta: {str(e)}")
         return JsonResponse({'status': 'error', 'message': f'Error al guardar la respuesta: {str(e)}'}, status=500)
 
+CLIENT_ID_VALIDO = re.compile(r'^[\w-]{1,64}$')
+
+
+def _respuesta_autoguardado(guia, evaluacion, ack_seq, aplicados):
+    """Respuesta JSON del autoguardado por lotes con el progreso de la evaluación."""
+    if evaluacion:
+        porcentaje_completado, preguntas_respondidas, total_preguntas = _progreso_evaluacion(evaluacion, guia, refrescar=False)
+    else:
+        porcentaje_completado, preguntas_respondidas, total_preguntas = 0, 0, guia.total_preguntas
+    return JsonResponse({
+        'status': 'success',
+        'ack_seq': ack_seq,
+        'aplicados': aplicados,
+        'porcentaje_completado': porcentaje_completado,
+        'preguntas_respondidas': preguntas_respondidas,
+        'total_preguntas': total_preguntas
+    })
+
+
+@login_required_async
+async def guardar_cambios(request, guia_pk):
+    """
+    Autoguardado por lotes. Recibe {client_id, client_seq, changes[]} con las ediciones
+    que el navegador acumuló durante una ráfaga y las aplica con una sola escritura y un
+    solo recálculo. Responde con ack_seq, el mayor número de secuencia aplicado, para que
+    el cliente descarte las ediciones confirmadas. Un lote repetido o atrasado
+    (client_seq menor o igual al último aplicado) se confirma sin volver a escribirse;
+    el último aplicado se guarda en SecuenciaAutoguardado y se reclama en la misma
+    transacción que escribe el lote, así que vale entre procesos y peticiones concurrentes.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        guia = await _obtener_guia_activa(guia_pk)
+        usuario = request.user
+
+        if not isinstance(data, dict):
+            return JsonResponse({'status': 'error', 'message': 'Se esperaba un objeto con client_id, client_seq y changes.'}, status=400)
+        client_id = data.get('client_id')
+        client_seq = data.get('client_seq')
+        changes = data.get('changes')
+        if not isinstance(client_id, str) or not CLIENT_ID_VALIDO.match(client_id):
+            return JsonResponse({'status': 'error', 'message': 'client_id inválido.'}, status=400)
+        if isinstance(client_seq, bool) or not isinstance(client_seq, int) or client_seq < 1:
+            return JsonResponse({'status': 'error', 'message': 'client_seq inválido.'}, status=400)
+        if not isinstance(changes, list):
+            return JsonResponse({'status': 'error', 'message': 'changes debe ser una lista.'}, status=400)
+
+        respuestas, errores = _validar_lote_respuestas(changes)
+        if errores:
+            return JsonResponse({'status': 'error', 'message': 'Datos de respuesta inválidos.', 'errores': errores}, status=400)
+
+        diferido = _autoguardado_diferido()
+        aplicado, ack_seq, evaluacion = await sync_to_async(_aplicar_lote_secuenciado)(
+            guia, usuario, client_id, client_seq, respuestas, diferido
+        )
+        if not aplicado:
+            # Reintento o lote atrasado: se confirma el último aplicado sin volver a escribir
+            return _respuesta_autoguardado(guia, evaluacion, ack_seq, 0)
+        if diferido:
+            progreso = await sync_to_async(_progreso_efectivo)(guia, usuario)
+            await sync_to_async(programar_aplicacion_diario)()
+            return _respuesta_diferida('Cambios registrados.', progreso, ack_seq=ack_seq, aplicados=len(respuestas))
+        return _respuesta_autoguardado(guia, evaluacion, ack_seq, len(respuestas))
+
+    except Http404:
+        raise
+    except ConflictoVersionEvaluacion as e:
+        logger.warning(f"Conflicto de versión en guardar_cambios: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': 'La evaluación se está modificando en otra pestaña. Intenta nuevamente.'}, status=409)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Formato JSON inválido.'}, status=400)
+    except Exception as e:
+        logger.error(f"Error en guardar_cambios: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': f'Error al guardar los cambios: {str(e)}'}, status=500)
+
+# Subida de evidencias por bloques: 'Content-Range: bytes inicio-fin/total' en cada bloque
+RANGO_BLOQUE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+def _estado_subida(subida, status=200):
+    """Respuesta JSON con el punto de reanudación de una subida de evidencia."""
+    return JsonResponse({
+        'status': 'success',
+        'token': str(subida.token),
+        'recibidos': subida.recibidos,
+        'tamano_total': subida.tamano_total,
+        'tamano_bloque': getattr(settings, 'GUIA_EVIDENCIA_TAMANO_BLOQUE', 5 * 1024 * 1024),
+        'completada': subida.estado == 'completada',
+        'archivo_id': subida.archivo_id,
+    }, status=status)
+
+
+@login_required
+def iniciar_subida_evidencia(request, guia_pk):
+    """
+    Abre una subida reanudable de evidencia para una pregunta.
+    Recibe {numero_pregunta, nombre, tamano} y devuelve el token con el que se envían los bloques.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+
+    guia = get_object_or_404(GuiaAutocontrol, pk=guia_pk, activa=True)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Formato JSON inválido.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'status': 'error', 'message': 'Se esperaba un objeto con numero_pregunta, nombre y tamano.'}, status=400)
+
+    numero_pregunta = data.get('numero_pregunta')
+    nombre = os.path.basename(str(data.get('nombre') or '')).strip()
+    tamano = data.get('tamano')
+    tamano_maximo = getattr(settings, 'GUIA_EVIDENCIA_TAMANO_MAXIMO', 200 * 1024 * 1024)
+    if isinstance(numero_pregunta, bool) or not isinstance(numero_pregunta, int):
+        return JsonResponse({'status': 'error', 'message': 'Número de pregunta inválido.'}, status=400)
+    if not nombre or len(nombre) > 255:
+        return JsonResponse({'status': 'error', 'message': 'Nombre de archivo inválido.'}, status=400)
+    if isinstance(tamano, bool) or not isinstance(tamano, int) or not 0 < tamano <= tamano_maximo:
+        return JsonResponse({'status': 'error', 'message': f'El tamaño debe estar entre 1 y {tamano_maximo} bytes.'}, status=400)
+
+    subida = SubidaEvidencia.objects.create(
+        guia=guia,
+        usuario=request.user,
+        numero_pregunta=numero_pregunta,
+        nombre=nombre,
+        tamano_total=tamano
+    )
+    return _estado_subida(subida, status=201)
+
+
+@login_required
+def subir_bloque_evidencia(request, token):
+    """
+    GET devuelve cuántos bytes se recibieron (para reanudar). PUT/POST recibe un bloque
+    como cuerpo binario con 'Content-Range: bytes inicio-fin/total'. El cuerpo se lee por
+    partes directamente al archivo parcial, sin cargarlo entero en memoria. Si el bloque no
+    continúa donde quedó la subida se responde 409 con el punto de reanudación.
+    """
+    subida = get_object_or_404(SubidaEvidencia, token=token, usuario=request.user)
+    if request.method == 'GET':
+        return _estado_subida(subida)
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
+
+    rango = RANGO_BLOQUE.match(request.headers.get('Content-Range', ''))
+    if not rango:
+        return JsonResponse({'status': 'error', 'message': 'Content-Range inválido.'}, status=400)
+    inicio, fin, total = (int(valor) for valor in rango.groups())
+    longitud = fin - inicio + 1
+    if total != subida.tamano_total or longitud < 1:
+        return JsonResponse({'status': 'error', 'message': 'El rango no corresponde a esta subida.'}, status=400)
+    if longitud > getattr(settings, 'GUIA_EVIDENCIA_TAMANO_BLOQUE', 5 * 1024 * 1024):
+        return JsonResponse({'status': 'error', 'message': 'El bloque supera el tamaño máximo.'}, status=413)
+    if request.headers.get('Content-Length') and int(request.headers['Content-Length']) != longitud:
+        return JsonResponse({'status': 'error', 'message': 'Content-Length no coincide con el rango.'}, status=400)
+
+    try:
+        with transaction.atomic():
+            # Un solo bloque a la vez por subida
+            subida = SubidaEvidencia.objects.select_for_update().get(pk=subida.pk)
+            subida.recibir_bloque(inicio, request, longitud)
+    except SubidaIncompatible as e:
+        subida.refresh_from_db()
+        return JsonResponse({'status': 'error', 'message': str(e), 'recibidos': subida.recibidos}, status=409)
+    except Exception as e:
+        logger.error(f"Error al recibir un bloque de la subida {token}: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': f'Error al recibir el bloque: {str(e)}'}, status=500)
+    return _estado_subida(subida)
+
+
 def _validar_evaluacion_completa(guia, user):
     """
     Verifica si todas las preguntas de la guía han sido respondidas por el usuario.
     Retorna el total de preguntas y el conteo de respuestas.
     """
-    all_preguntas_from_guia = []
-    if guia.contenido_procesado and 'tablas_cuestionario' in guia.contenido_procesado:
-        for categoria in guia.contenido_procesado['tablas_cuestionario']:
-            for bloque in categoria.get('bloques', []):
-                for pregunta in bloque.get('preguntas', []):
-                    all_preguntas_from_guia.append(pregunta)
-    
-    total_preguntas = len(all_preguntas_from_guia)
-    respuestas_count = RespuestaGuia.objects.filter(guia=guia, usuario=user).count()
+    total_preguntas = len(guia.get_indice()['preguntas'])
+    # Cuenta también las respuestas que siguen pendientes en el diario
+    respuestas_count = len(DiarioRespuesta.respuestas_efectivas(guia.pk, user.pk))
     
     return total_preguntas, respuestas_count
 
@@ -331,7 +774,9 @@ def completar_evaluacion(request, guia_pk):
         if request.method == 'POST':
             evaluacion.observaciones_generales = request.POST.get('observaciones_generales', '')
         
-        evaluacion.save()
+        if not evaluacion.guardar_condicional(['estado', 'fecha_completado', 'porcentaje_cumplimiento']):
+            messages.warning(request, 'La evaluación se modificó en otra pestaña. Revisa tus respuestas e inténtalo de nuevo.')
+            return redirect('guia:detalle', pk=guia_pk)
         messages.success(request, 'Evaluación completada exitosamente.')
         return redirect('guia:resumen_evaluacion', pk=evaluacion.pk)
 
@@ -344,16 +789,9 @@ def _calcular_estadisticas_por_categoria(evaluacion, respuestas):
     Calcula las estadísticas (si/no/na) por cada categoría de la guía.
     """
     stats_por_categoria = {}
-    guia_actual = evaluacion.guia
     
-    # Pre-calcular el mapeo de preguntas a categorías para evitar bucles anidados repetitivos
-    pregunta_a_categoria = {}
-    if guia_actual.contenido_procesado and 'tablas_cuestionario' in guia_actual.contenido_procesado:
-        for categoria_data in guia_actual.contenido_procesado['tablas_cuestionario']:
-            categoria_nombre = categoria_data.get('componente_a_evaluar', 'General')
-            for bloque in categoria_data.get('bloques', []):
-                for pregunta in bloque.get('preguntas', []):
-                    pregunta_a_categoria[pregunta.get('numero_pregunta')] = categoria_nombre
+    # El mapeo pregunta -> componente viene del índice precalculado de la guía
+    pregunta_a_categoria = evaluacion.guia.get_indice()['componente_de']
 
     for respuesta in respuestas:
         # Usar el mapeo pre-calculado para obtener la categoría
@@ -382,104 +820,126 @@ def resumen_evaluacion(request, pk):
 
     stats_por_categoria = _calcular_estadisticas_por_categoria(evaluacion, respuestas)
 
-    total_si = respuestas.filter(respuesta='si').count()
-    total_no = respuestas.filter(respuesta='no').count()
-    total_na = respuestas.filter(respuesta='na').count()
+    # Los totales se cuentan en el vector empaquetado de la evaluación, sin consultas COUNT
+    totales = evaluacion.contar_respuestas()
 
     context = {
         'evaluacion': evaluacion,
         'respuestas': respuestas,
         'stats_por_categoria': stats_por_categoria,
-        'total_si': total_si,
-        'total_no': total_no,
-        'total_na': total_na,
+        'total_si': totales['si'],
+        'total_no': totales['no'],
+        'total_na': totales['na'],
     }
     return render(request, 'guia/resumen_evaluacion.html', context)
 
-def _clasificar_evaluaciones(evaluaciones):
-    """
-    Clasifica las evaluaciones en completadas y en progreso.
-    """
-    # Ordenar: primero no completadas, luego completadas
-    def is_completed(ev):
-        return 1 if ev.estado == 'completada' else 0
-    
-    evaluaciones_ordenadas = sorted(evaluaciones, key=is_completed)
-    evaluaciones_completadas = [e for e in evaluaciones_ordenadas if e.estado == 'completada']
-    evaluaciones_en_progreso = [e for e in evaluaciones_ordenadas if e.estado == 'en_progreso']
-    
-    return evaluaciones_ordenadas, evaluaciones_completadas, evaluaciones_en_progreso
+EVALUACIONES_POR_PAGINA = 10
+
 
-def _calcular_estadisticas_evaluacion(evaluaciones, completadas, en_progreso):
+def _estadisticas_evaluaciones(evaluaciones):
     """
-    Calcula diversas estadísticas a partir de las evaluaciones clasificadas.
+    Estadísticas de las evaluaciones de un usuario: los totales y el promedio salen de un
+    solo aggregate y las listas destacadas de consultas pequeñas con LIMIT.
     """
-    total_evaluaciones = len(evaluaciones)
-    total_completadas = len(completadas)
-    total_en_progreso = len(en_progreso)
-    
-    promedio_cumplimiento = sum(e.porcentaje_cumplimiento for e in completadas) / total_completadas if total_completadas > 0 else 0
-    
-    stats_por_estado = {
-        'completada': total_completadas,
-        'en_progreso': total_en_progreso,
-        'pendiente': len([e for e in evaluaciones if hasattr(e, 'estado') and e.estado == 'pendiente'])
-    }
-
-    ultimas_completadas = sorted(completadas, key=lambda e: e.fecha_completado or e.fecha_inicio, reverse=True)[:5]
-    mejor_evaluacion = max(completadas, key=lambda e: getattr(e, 'respuestas_si', 0), default=None)
-    evaluaciones_bajo_rendimiento = sorted([e for e in completadas if e.porcentaje_cumplimiento < 60], key=lambda e: e.porcentaje_cumplimiento)
-    
-    porcentaje_completadas = round((total_completadas / total_evaluaciones * 100), 1) if total_evaluaciones > 0 else 0
+    totales = evaluaciones.aggregate(
+        total_evaluaciones=Count('pk'),
+        total_completadas=Count('pk', filter=Q(estado='completada')),
+        total_en_progreso=Count('pk', filter=Q(estado='en_progreso')),
+        total_no_iniciadas=Count('pk', filter=Q(estado='no_iniciada')),
+        total_bajo_rendimiento=Count('pk', filter=Q(estado='completada', porcentaje_cumplimiento__lt=60)),
+        promedio_cumplimiento=Avg('porcentaje_cumplimiento', filter=Q(estado='completada')),
+    )
+    total_evaluaciones = totales['total_evaluaciones']
+    total_completadas = totales['total_completadas']
+    completadas = evaluaciones.filter(estado='completada')
 
     return {
         'total_evaluaciones': total_evaluaciones,
         'total_completadas': total_completadas,
-        'total_en_progreso': total_en_progreso,
-        'promedio_cumplimiento': round(promedio_cumplimiento, 1),
-        'stats_por_estado': stats_por_estado,
-        'ultimas_completadas': ultimas_completadas,
-        'mejor_evaluacion': mejor_evaluacion,
-        'evaluaciones_bajo_rendimiento': evaluaciones_bajo_rendimiento,
-        'porcentaje_completadas': porcentaje_completadas,
+        'total_en_progreso': totales['total_en_progreso'],
+        'promedio_cumplimiento': round(totales['promedio_cumplimiento'] or 0, 1),
+        'stats_por_estado': {
+            'completada': total_completadas,
+            'en_progreso': totales['total_en_progreso'],
+            'pendiente': totales['total_no_iniciadas'],
+        },
+        'ultimas_completadas': list(
+            completadas.order_by(Coalesce('fecha_completado', 'fecha_inicio').desc(), '-pk')[:5]
+        ),
+        'mejor_evaluacion': completadas.order_by('-respuestas_si', '-fecha_inicio', '-pk').first(),
+        'evaluaciones_bajo_rendimiento': list(
+            completadas.filter(porcentaje_cumplimiento__lt=60).order_by('porcentaje_cumplimiento', 'pk')[:3]
+        ),
+        'total_bajo_rendimiento': totales['total_bajo_rendimiento'],
+        'porcentaje_completadas': round((total_completadas / total_evaluaciones * 100), 1) if total_evaluaciones > 0 else 0,
     }
 
+
+def _cursor_evaluacion(evaluacion):
+    """Cursor de paginación por clave: (completada, fecha_inicio, pk) de la última fila mostrada."""
+    return f'{evaluacion.completada}_{evaluacion.fecha_inicio.isoformat()}_{evaluacion.pk}'
+
+
+def _pagina_evaluaciones(evaluaciones, cursor):
+    """
+    Una página de evaluaciones ordenadas por (completada, fecha_inicio desc, pk desc): primero
+    las no completadas y, dentro de cada grupo, las más recientes. La página siguiente se
+    pide con el cursor de la última fila, así que no se cuentan ni se saltan filas.
+    Retorna (evaluaciones de la página, cursor de la siguiente o None).
+    """
+    evaluaciones = evaluaciones.annotate(
+        completada=Case(When(estado='completada', then=1), default=0, output_field=IntegerField())
+    ).order_by('completada', '-fecha_inicio', '-pk')
+
+    partes = (cursor or '').split('_')
+    if len(partes) == 3 and partes[0] in ('0', '1') and partes[2].isdigit() and parse_datetime(partes[1]):
+        completada, fecha_inicio, pk = int(partes[0]), parse_datetime(partes[1]), int(partes[2])
+        evaluaciones = evaluaciones.filter(
+            Q(completada__gt=completada)
+            | Q(completada=completada, fecha_inicio__lt=fecha_inicio)
+            | Q(completada=completada, fecha_inicio=fecha_inicio, pk__lt=pk)
+        )
+
+    pagina = list(evaluaciones[:EVALUACIONES_POR_PAGINA + 1])
+    if len(pagina) > EVALUACIONES_POR_PAGINA:
+        pagina = pagina[:EVALUACIONES_POR_PAGINA]
+        return pagina, _cursor_evaluacion(pagina[-1])
+    return pagina, None
+
+
 @login_required
 def mis_evaluaciones(request):
-    evaluaciones = EvaluacionGuia.objects.filter(usuario=request.user).select_related('guia', 'guia__archivo')
-    
-    # Lógica de clasificación
-    evaluaciones_ordenadas, evaluaciones_completadas, evaluaciones_en_progreso = _clasificar_evaluaciones(evaluaciones)
-    
-    # Lógica de cálculo de estadísticas
-    stats_context = _calcular_estadisticas_evaluacion(evaluaciones_ordenadas, evaluaciones_completadas, evaluaciones_en_progreso)
-    
-    # Paginación
-    paginator = Paginator(evaluaciones_ordenadas, 10)
-    page = request.GET.get('page')
-    evaluaciones_paginadas = paginator.get_page(page)
-    
-    # Preparar contexto final
+    evaluaciones = EvaluacionGuia.objects.filter(usuario=request.user).select_related('guia').defer(
+        'vector_respuestas', 'guia__contenido_procesado', 'guia__indice_preguntas'
+    )
+    cursor = request.GET.get('despues')
+    pagina, siguiente = _pagina_evaluaciones(evaluaciones, cursor)
+
     context = {
-        'evaluaciones': evaluaciones_paginadas,
-        **stats_context
+        'evaluaciones': pagina,
+        'es_primera_pagina': not cursor,
+        'cursor_siguiente': siguiente,
+        **_estadisticas_evaluaciones(evaluaciones),
     }
-    
     return render(request, 'guia/mis_evaluaciones.html', context)
 
 @login_required
 def procesar_archivo_guia(request, archivo_id):
     archivo = get_object_or_404(Archivo, id=archivo_id, es_formulario=True)
     guia_existente = GuiaAutocontrol.objects.filter(archivo=archivo).first()
+    if guia_existente and guia_existente.estado_procesamiento == 'fallida':
+        encolar_extraccion(guia_existente)
+        messages.info(request, 'El procesamiento anterior falló; la guía se volvió a encolar para procesarse.')
+        return redirect('guia:lista')
     if guia_existente:
         messages.info(request, 'Ya existe una guía para este archivo.')
         return redirect('guia:detalle', pk=guia_existente.pk)
 
     try:
         guia = GuiaAutocontrol.objects.create(archivo=archivo, titulo_guia=archivo.nombre, activa=True)
-        guia.extraer_contenido_archivo()
-        messages.success(request, 'Guía creada y procesada exitosamente.')
-        return redirect('guia:detalle', pk=guia.pk)
+        encolar_extraccion(guia)
+        messages.success(request, 'Guía creada. El contenido se está procesando y aparecerá en la lista al terminar.')
+        return redirect('guia:lista')
     except Exception as e:
         messages.error(request, f'Error al procesar el archivo: {str(e)}')
         return redirect('guia:lista')
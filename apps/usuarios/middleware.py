@@ -1,16 +1,36 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.utils import timezone
 from .models import Perfil
 import logging
 
 logger = logging.getLogger(__name__)
 class UpdateLastActivityMiddleware:
-    """Middleware para actualizar la última actividad del usuario"""
-    
+    """
+    Middleware para actualizar la última actividad del usuario.
+    Admite vistas síncronas y asíncronas: bajo ASGI no obliga a las vistas async
+    a pasar por el hilo síncrono compartido.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
+        self._actualizar_actividad(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await sync_to_async(self._actualizar_actividad)(request)
+        return response
+
+    def _actualizar_actividad(self, request):
         # Actualizar last_activity si el usuario está autenticado
         if request.user.is_authenticated:
             try:
@@ -19,5 +39,3 @@ class UpdateLastActivityMiddleware:
                 perfil.save(update_fields=['last_activity'])
             except Exception as e:
                 logger.error(f"Error al actualizar last_activity: {e}")
-        
-        return response
\ No newline at end of file
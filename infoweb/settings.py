@@ -145,6 +145,26 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Backend de lectura de guías .docx: 'python-docx' (árbol de objetos completo)
+# o 'streaming' (lectura incremental de word/document.xml)
+GUIA_PARSER_DOCX = 'streaming'
+
+# Extracción de guías en segundo plano: 'celery' (requiere un worker configurado),
+# 'local' (pool de hilos en el propio proceso) o 'sincrono' (dentro de la petición)
+GUIA_EXTRACCION_MODO = 'local'
+GUIA_EXTRACCION_HILOS = 2
+
+# Autoguardado de respuestas: 'directo' (se escriben en RespuestaGuia dentro de la petición)
+# o 'diario' (se anotan en DiarioRespuesta y un worker las aplica por lotes)
+GUIA_AUTOGUARDADO_MODO = 'directo'
+# Aplicación del diario: 'celery', 'local' (hilo del propio proceso) o 'sincrono'
+GUIA_DIARIO_APLICACION = 'local'
+GUIA_DIARIO_LOTE = 500
+
+# Evidencias: subida reanudable por bloques (bytes)
+GUIA_EVIDENCIA_TAMANO_BLOQUE = 5 * 1024 * 1024
+GUIA_EVIDENCIA_TAMANO_MAXIMO = 200 * 1024 * 1024
+
 # Configuración de crispy-forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
 CRISPY_TEMPLATE_PACK = 'bootstrap4' # O 'bootstrap5' si usas Bootstrap 5
@@ -1,5 +1,29 @@
 //Muestra el textarea cuando se marque la opcion no
 document.addEventListener('DOMContentLoaded', function () {
+    // --- INICIO: Respuestas del usuario sobre el árbol de preguntas ---
+    // El árbol de preguntas llega igual para todos los usuarios (se cachea en el servidor);
+    // las respuestas propias se aplican aquí desde el JSON "datos-usuario"
+    var datosUsuarioScript = document.getElementById('datos-usuario');
+    var datosUsuario = datosUsuarioScript
+        ? JSON.parse(datosUsuarioScript.textContent)
+        : { respuestas: {}, porcentaje_completado: 0 };
+    Object.keys(datosUsuario.respuestas).forEach(function (preguntaId) {
+        var datos = datosUsuario.respuestas[preguntaId];
+        var radio = document.getElementById('respuesta_' + preguntaId + '_' + datos.respuesta);
+        if (!radio) return;
+        radio.checked = true;
+        var textarea = document.getElementById('fundamentacion_' + preguntaId);
+        if (textarea) textarea.value = datos.fundamentacion || '';
+        if (datosUsuario.porcentaje_completado === 100) {
+            var indicador = document.querySelector('.question-item[data-question-id="' + preguntaId + '"] .completion-indicator');
+            if (indicador) {
+                indicador.classList.add('completed');
+                indicador.innerHTML = '<i class="fas fa-check"></i>';
+            }
+        }
+    });
+    // --- FIN: Respuestas del usuario sobre el árbol de preguntas ---
+
     // --- INICIO: Lógica de inicialización y visibilidad de campos ---
     // Al cargar el DOM, busca todos los radios de respuestas y ajusta la visibilidad del campo de fundamentación
     var radios = document.querySelectorAll('input[name^="respuesta_"]');
@@ -87,14 +111,47 @@ document.addEventListener('DOMContentLoaded', function () {
         return; // Detener la ejecución si el formulario no se encuentra
     }
 
-    // Envía una respuesta individual al backend
+    // Los cambios de una ráfaga de clics se acumulan y se envían en un solo lote
+    const VENTANA_AUTOGUARDADO_MS = 800;
+    const clientId = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    let clientSeq = 0;
+    const cambiosPendientes = new Map(); // numero_pregunta -> { seq, cambio }
+    let temporizadorAutoguardado = null;
+    let loteEnVuelo = false;
+
+    // Registra el cambio de una pregunta y programa el envío del lote
     function sendResponse(questionNumber, responseValue, fundamentacionValue) {
-        const url = `/guia/guardar_respuesta/${form.dataset.guiaPk}/`;
+        clientSeq += 1;
+        cambiosPendientes.set(Number(questionNumber), {
+            seq: clientSeq,
+            cambio: {
+                numero_pregunta: Number(questionNumber),
+                respuesta: responseValue,
+                fundamentacion: fundamentacionValue
+            }
+        });
+        programarEnvioCambios();
+    }
+
+    function programarEnvioCambios() {
+        clearTimeout(temporizadorAutoguardado);
+        temporizadorAutoguardado = setTimeout(enviarCambios, VENTANA_AUTOGUARDADO_MS);
+    }
+
+    // Envía al backend los cambios pendientes; solo hay un lote en vuelo a la vez
+    function enviarCambios() {
+        if (loteEnVuelo || cambiosPendientes.size === 0) return;
+        const url = `/guia/guardar_cambios/${form.dataset.guiaPk}/`;
+        const preguntasDelLote = Array.from(cambiosPendientes.keys());
+        const seqDelLote = clientSeq;
         const data = {
-            numero_pregunta: Number(questionNumber),
-            respuesta: responseValue,
-            fundamentacion: fundamentacionValue
+            client_id: clientId,
+            client_seq: seqDelLote,
+            changes: Array.from(cambiosPendientes.values()).map(pendiente => pendiente.cambio)
         };
+        loteEnVuelo = true;
 
         fetchWithTimeout(url, {
             method: 'POST',
@@ -107,18 +164,26 @@ document.addEventListener('DOMContentLoaded', function () {
         .then(response => response.json())
         .then(data => {
             if (data.status === 'success') {
-                //showTemporaryMessage('Respuesta guardada correctamente.', 'success', questionNumber);
+                // Descarta las ediciones confirmadas; las posteriores siguen pendientes
+                cambiosPendientes.forEach((pendiente, numero) => {
+                    if (pendiente.seq <= data.ack_seq) cambiosPendientes.delete(numero);
+                });
             } else {
-                showTemporaryMessage(data.message || 'Hubo un error al guardar la respuesta.', 'danger', questionNumber);
+                preguntasDelLote.forEach(numero => {
+                    showTemporaryMessage(data.message || 'Hubo un error al guardar la respuesta.', 'danger', numero);
+                });
             }
         })
         .catch(error => {
             const errorMsg = error.message || 'Error de red o del servidor al guardar la respuesta.';
-            showTemporaryMessage(errorMsg, 'danger', questionNumber);
-            console.error('Error en sendResponse:', error);
+            preguntasDelLote.forEach(numero => showTemporaryMessage(errorMsg, 'danger', numero));
+            console.error('Error en enviarCambios:', error);
         })
         .finally(() => {
+            loteEnVuelo = false;
             hideLoadingSpinner(); // Asegurar que el spinner siempre se oculta
+            // Los cambios llegados mientras el lote estaba en vuelo salen en el siguiente
+            if (clientSeq > seqDelLote) programarEnvioCambios();
         });
     }
     // --- FIN: Manejo de envío de respuestas individuales ---
@@ -184,6 +249,8 @@ document.addEventListener('DOMContentLoaded', function () {
     const guardarBtn = document.getElementById('guardar-todo-btn');
     if (guardarBtn) {
         guardarBtn.addEventListener('click', function () {
+            // El guardado completo incluye los cambios que aún esperaban su lote
+            clearTimeout(temporizadorAutoguardado);
             showLoadingSpinner();
             // Recolecta todas las respuestas del formulario
             const preguntas = document.querySelectorAll('.question-item');